@@ -1,30 +1,54 @@
 # app/__init__.py
 # Flask application factory.
-# - Initializes extensions (db, migrate, bcrypt, login_manager)
-# - Registers blueprints (auth, notes)
+# - Initializes extensions (db, migrate, bcrypt, login_manager, response_cache, jobs, shards, profiler, admission)
+# - Registers blueprints (auth, notes) and CLI commands
 # - Configures the app and provides root health check
+# - GET /stats: this process's response cache and admission counters (enabled by STATS_TOKEN)
 
+import hmac
+import json
 import os
-from flask import Flask
+from flask import Flask, request
 from flask_login import LoginManager
-from .extensions import db, migrate, bcrypt
+from .extensions import db, migrate, bcrypt, response_cache, jobs, shards, profiler, admission
 from .models import User
 
 login_manager = LoginManager()
 
-def create_app():
+def create_app(test_config=None):
     app = Flask(__name__)
 
     # --- Config ---
     app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL", "sqlite:///dev.db")
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "change-me")  # needed for sessions
+    app.config["NOTES_TOMBSTONE_RETENTION_DAYS"] = int(os.getenv("NOTES_TOMBSTONE_RETENTION_DAYS", 30))
+    app.config["RESPONSE_CACHE_ENABLED"] = os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1"
+    app.config["JOBS_WORKERS"] = int(os.getenv("JOBS_WORKERS", 2))  # 0 = only `manage.py worker` runs jobs
+    app.config["NOTES_SHARDS"] = int(os.getenv("NOTES_SHARDS", 1))
+    app.config["NOTES_SHARD_URL"] = os.getenv("NOTES_SHARD_URL", "sqlite:///notes_{shard}.db")
+    app.config["IDEMPOTENCY_TTL_SECONDS"] = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 24 * 60 * 60))
+    app.config["IDEMPOTENCY_WAIT_SECONDS"] = 10   # how long a duplicate waits on the in-flight request
+    app.config["IDEMPOTENCY_LOCK_SECONDS"] = 60   # in-flight keys older than this are abandoned
+    app.config["IDEMPOTENCY_POLL_SECONDS"] = 0.05
+    app.config["PROFILER_ENABLED"] = os.getenv("PROFILER_ENABLED", "0") == "1"
+    app.config["PROFILER_SAMPLE_RATE"] = int(os.getenv("PROFILER_SAMPLE_RATE", 100))  # 1 in N; 0 = header only
+    app.config["PROFILER_MODE"] = os.getenv("PROFILER_MODE", "cprofile")  # or "sampler"
+    app.config["ADMISSION_ENABLED"] = os.getenv("ADMISSION_ENABLED", "1") == "1"
+    app.config["ADMISSION_POOLS"] = json.loads(os.getenv("ADMISSION_POOLS", "{}"))  # per-pool overrides
+    app.config["STATS_TOKEN"] = os.getenv("STATS_TOKEN")  # bearer token for GET /stats; unset = disabled
+    if test_config:
+        app.config.update(test_config)
 
     # --- Init extensions ---
+    profiler.init_app(app)  # first, so its hooks wrap every other request hook
+    shards.init_app(app)  # adds shard binds, so it must run before db
     db.init_app(app)
     migrate.init_app(app, db)
     bcrypt.init_app(app)
     login_manager.init_app(app)
+    response_cache.init_app(app)
+    jobs.init_app(app)
 
     # --- Blueprints ---
     from .routes.auth import auth_bp
@@ -33,11 +57,34 @@ def create_app():
     app.register_blueprint(auth_bp)
     app.register_blueprint(notes_bp, url_prefix="/notes")
 
+    # --- CLI ---
+    from .commands import notes_cli, profile_cli, worker
+
+    app.cli.add_command(notes_cli)
+    app.cli.add_command(profile_cli)
+    app.cli.add_command(worker)
+
     # --- Health check ---
     @app.get("/")
     def health():
         return {"status": "ok"}
-    
+
+    # --- Operator stats (per worker process, so pid tells them apart) ---
+    @app.get("/stats")
+    def stats():
+        token = app.config["STATS_TOKEN"]
+        supplied = request.headers.get("Authorization", "")
+        if not token or not hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode()):
+            return {"error": "Not found"}, 404
+        return {
+            "pid": os.getpid(),
+            "response_cache": response_cache.stats(),
+            "admission": admission.stats(app),
+        }
+
+    # --- Admission control (outermost WSGI layer; health check and stats bypass it) ---
+    admission.init_app(app)
+
     return app
 
 @login_manager.user_loader
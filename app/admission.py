@@ -0,0 +1,174 @@
+# app/admission.py
+# Admission control and load shedding for the whole WSGI app.
+# - Each request is assigned to a pool by blueprint ("auth", "notes", everything else "default")
+# - A pool admits up to `limit` concurrent requests; extras wait in a bounded queue until a deadline
+# - Requests that cannot be admitted get a fast 503 with Retry-After instead of piling up
+# - Limits adapt with AIMD: cut multiplicatively when latency exceeds the pool's target,
+#   grow additively while the pool is saturated and healthy
+# - The "/" health check and "/stats" (ADMISSION_BYPASS endpoints) are never limited, so
+#   operators can read the counters while the app is shedding
+
+import json
+import threading
+import time
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import RequestRedirect
+
+DEFAULT_POOLS = {
+    # bcrypt-heavy: few slots, generous latency target
+    "auth": {"limit": 4, "min_limit": 1, "max_limit": 16, "max_queue": 16, "timeout": 2.0, "target_latency": 1.0},
+    "notes": {"limit": 16, "min_limit": 2, "max_limit": 64, "max_queue": 64, "timeout": 1.0, "target_latency": 0.25},
+    "default": {"limit": 16, "min_limit": 2, "max_limit": 64, "max_queue": 32, "timeout": 1.0, "target_latency": 0.5},
+}
+
+
+class AdaptiveLimiter:
+    """Concurrency limit with a bounded, deadline-based wait queue and an AIMD-adjusted limit."""
+
+    def __init__(self, name, limit, min_limit, max_limit, max_queue, timeout, target_latency,
+                 decrease=0.9):
+        self.name = name
+        self.limit = float(limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.target_latency = target_latency
+        self.decrease = decrease
+        self.inflight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def _has_room(self):
+        return self.inflight < max(int(self.limit), 1)
+
+    def acquire(self):
+        """Admit the caller, waiting up to `timeout` for a slot. Returns False to shed."""
+        with self._cond:
+            if self.waiting == 0 and self._has_room():
+                self.inflight += 1
+                self.admitted += 1
+                return True
+            if self.waiting >= self.max_queue:
+                self.shed += 1
+                return False
+
+            self.waiting += 1
+            deadline = time.monotonic() + self.timeout
+            try:
+                while not self._has_room():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.shed += 1
+                        return False
+                    self._cond.wait(remaining)
+                self.inflight += 1
+                self.admitted += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self, latency):
+        """Free a slot and feed the request's latency into the limit."""
+        with self._cond:
+            saturated = self.inflight >= int(self.limit)
+            self.inflight -= 1
+            if latency > self.target_latency:
+                # Cut at most once per latency window so one slow burst is not punished repeatedly
+                now = time.monotonic()
+                if now - self._last_decrease >= self.target_latency:
+                    self.limit = max(self.min_limit, self.limit * self.decrease)
+                    self._last_decrease = now
+            elif saturated:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "limit": round(self.limit, 2),
+                "inflight": self.inflight,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "shed": self.shed,
+            }
+
+
+class AdmissionMiddleware:
+    """WSGI middleware applying per-pool admission control in front of a Flask app."""
+
+    def __init__(self, wsgi_app, app, pools, bypass):
+        self.wsgi_app = wsgi_app
+        self.app = app
+        self.bypass = set(bypass)
+        self.limiters = {name: AdaptiveLimiter(name, **options) for name, options in pools.items()}
+
+    def _pool(self, environ):
+        try:
+            endpoint, _ = self.app.url_map.bind_to_environ(environ).match()
+        except (HTTPException, RequestRedirect):
+            return "default"
+        if endpoint in self.bypass:
+            return None
+        blueprint = endpoint.rpartition(".")[0]
+        return blueprint if blueprint in self.limiters else "default"
+
+    def __call__(self, environ, start_response):
+        pool = self._pool(environ)
+        if pool is None:
+            return self.wsgi_app(environ, start_response)
+
+        limiter = self.limiters[pool]
+        if not limiter.acquire():
+            body = json.dumps({"error": "Server is overloaded, please retry shortly."}).encode()
+            start_response("503 SERVICE UNAVAILABLE", [
+                ("Content-Type", "application/json"),
+                ("Content-Length", str(len(body))),
+                ("Retry-After", "1"),
+            ])
+            return [body]
+
+        # Flask builds the whole response inside wsgi_app, so the slot is released when it
+        # returns; a streamed body is sent outside the limit.
+        started = time.monotonic()
+        try:
+            return self.wsgi_app(environ, start_response)
+        finally:
+            limiter.release(time.monotonic() - started)
+
+
+class AdmissionControl:
+    """
+    Flask extension installing AdmissionMiddleware around app.wsgi_app.
+    - Config: ADMISSION_ENABLED, ADMISSION_POOLS (per-pool overrides of DEFAULT_POOLS),
+      ADMISSION_BYPASS (endpoints that are never limited).
+    - Call init_app last in create_app so the middleware is outermost.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("ADMISSION_ENABLED", True)
+        app.config.setdefault("ADMISSION_POOLS", {})
+        app.config.setdefault("ADMISSION_BYPASS", ["health", "stats", "static"])
+        if not app.config["ADMISSION_ENABLED"]:
+            return
+
+        pools = {name: dict(options) for name, options in DEFAULT_POOLS.items()}
+        for name, overrides in app.config["ADMISSION_POOLS"].items():
+            pools.setdefault(name, dict(DEFAULT_POOLS["default"])).update(overrides)
+        middleware = AdmissionMiddleware(app.wsgi_app, app, pools, app.config["ADMISSION_BYPASS"])
+        app.wsgi_app = middleware
+        app.extensions["admission"] = middleware
+
+    def stats(self, app):
+        """Per-pool limit, in-flight, waiting, admitted and shed counts."""
+        middleware = app.extensions.get("admission")
+        if middleware is None:
+            return {}
+        return {name: limiter.stats() for name, limiter in middleware.limiters.items()}
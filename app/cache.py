@@ -0,0 +1,181 @@
+# app/cache.py
+# Per-user response cache for read-heavy list endpoints.
+# - Keys: (user_id, per-user generation, normalized query args)
+# - Writes bump the user's generation after commit, so invalidation is O(1) and stale entries age out via LRU
+# - Backends share one interface: InProcessBackend now, a shared store (e.g. Redis) later
+# - Hit/miss/eviction counters via stats() (served on GET /stats) and an X-Cache response header
+
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request, Response
+from flask_login import current_user
+
+
+class CacheBackend(ABC):
+    """Storage interface for ResponseCache."""
+
+    @abstractmethod
+    def get(self, key):
+        """Return the cached (status, body) for key, or None."""
+
+    @abstractmethod
+    def set(self, key, value):
+        """Store a (status, body) pair under key."""
+
+    @abstractmethod
+    def generation(self, user_id):
+        """Return the user's current generation counter."""
+
+    @abstractmethod
+    def bump(self, user_id):
+        """Advance the user's generation, orphaning every cached entry for them."""
+
+    @abstractmethod
+    def stats(self):
+        """Return a dict of counters (hits, misses, evictions, entries, bytes, ...)."""
+
+
+class InProcessBackend(CacheBackend):
+    """
+    Thread-safe LRU cache held in this process's memory.
+    - Evicts least-recently-used entries past max_entries or max_bytes.
+    - Tracks generations for the max_generations most recently bumped users; the rest share
+      a floor raised on every eviction, so a generation never goes backwards (which could
+      revive a stale entry) and an evicted user's entries are merely orphaned.
+    - Only coherent for a single worker process; use a shared backend otherwise.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, max_generations=16384):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_generations = max_generations
+        self._entries = OrderedDict()
+        self._generations = OrderedDict()  # least recently bumped first
+        self._clock = 0  # highest generation handed out
+        self._floor = 0  # generation of users not in _generations
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = self._misses = self._evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key, value):
+        size = len(value[1])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = value
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted[1])
+                self._evictions += 1
+
+    def generation(self, user_id):
+        with self._lock:
+            return self._generations.get(user_id, self._floor)
+
+    def bump(self, user_id):
+        with self._lock:
+            self._clock += 1
+            self._generations[user_id] = self._clock
+            self._generations.move_to_end(user_id)
+            while len(self._generations) > self.max_generations:
+                self._generations.popitem(last=False)
+                self._floor = self._clock
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "generations": len(self._generations),
+            }
+
+
+class ResponseCache:
+    """
+    Flask extension wrapping a CacheBackend.
+    - Each app gets its own backend (stored in app.extensions["response_cache"]).
+    - Config: RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES,
+      RESPONSE_CACHE_MAX_GENERATIONS.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, backend=None):
+        app.config.setdefault("RESPONSE_CACHE_ENABLED", True)
+        app.config.setdefault("RESPONSE_CACHE_MAX_ENTRIES", 1024)
+        app.config.setdefault("RESPONSE_CACHE_MAX_BYTES", 16 * 1024 * 1024)
+        app.config.setdefault("RESPONSE_CACHE_MAX_GENERATIONS", 16384)
+        app.extensions["response_cache"] = backend or InProcessBackend(
+            max_entries=app.config["RESPONSE_CACHE_MAX_ENTRIES"],
+            max_bytes=app.config["RESPONSE_CACHE_MAX_BYTES"],
+            max_generations=app.config["RESPONSE_CACHE_MAX_GENERATIONS"],
+        )
+
+    @property
+    def backend(self):
+        return current_app.extensions["response_cache"]
+
+    def stats(self):
+        return self.backend.stats()
+
+    def invalidate(self, user_id):
+        """Drop every cached response for a user. Call after the write commits."""
+        self.backend.bump(user_id)
+
+    def cached(self, view):
+        """
+        Cache a login-protected GET view per user and normalized query args.
+        - Only 200 responses are stored.
+        - Sets X-Cache: HIT or MISS on cacheable responses.
+        """
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not current_app.config["RESPONSE_CACHE_ENABLED"]:
+                return view(*args, **kwargs)
+
+            backend = self.backend
+            user_id = current_user.id
+            # Read the generation before running the view so a concurrent write
+            # can only orphan this entry, never leave it stale under a live key.
+            key = (
+                user_id,
+                backend.generation(user_id),
+                request.endpoint,
+                tuple(sorted(request.args.items(multi=True))),
+            )
+
+            hit = backend.get(key)
+            if hit is not None:
+                status, body = hit
+                resp = Response(body, status=status, mimetype="application/json")
+                resp.headers["X-Cache"] = "HIT"
+                return resp
+
+            resp = current_app.make_response(view(*args, **kwargs))
+            if resp.status_code == 200:
+                backend.set(key, (resp.status_code, resp.get_data()))
+            resp.headers["X-Cache"] = "MISS"
+            return resp
+
+        return wrapper
@@ -0,0 +1,136 @@
+# app/commands.py
+# Flask CLI commands (available via `flask <group> <command>`).
+# - notes purge-deleted: batch purge of soft-deleted notes past the retention window
+# - notes compress-bodies: online, batched compression of bodies stored before CompressedText
+# - notes create-shards / notes reshard: set up or rebalance user-sharded note storage
+# - worker: drain the background job queue out of process
+# - profile token / profile report: signed X-Profile header and per-endpoint profile aggregation
+
+import os
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from .extensions import db, jobs, profiler, shards
+from .models import Note
+from .profiling import HEADER as PROFILE_HEADER, aggregate_profiles
+from .sync import purge_deleted_notes
+from .types import decode_text, encode_text
+
+notes_cli = AppGroup("notes", help="Maintenance commands for notes.")
+profile_cli = AppGroup("profile", help="Request profiler tools.")
+
+
+@notes_cli.command("purge-deleted")
+@click.option("--batch-size", default=500, show_default=True, help="Rows deleted per transaction.")
+def purge_deleted(batch_size):
+    """Hard-delete note tombstones older than the retention window."""
+    purged = purge_deleted_notes(batch_size=batch_size)
+    click.echo(f"Purged {purged} deleted notes")
+
+
+def compress_note_bodies(batch_size=200):
+    """
+    Rewrite note bodies not stored the way CompressedText writes them today: large plain
+    rows, and compressed rows from before compressed values kept a plain preview head.
+    - Walks each shard in id order, one transaction per batch, so it can run while the app serves traffic.
+    - Each UPDATE is guarded on the value it read, so a concurrent edit is left alone.
+    - updated_at is preserved; the content is unchanged, so sync clients see nothing.
+    - Returns (scanned, rewritten).
+    """
+    body_type = Note.body.type
+    stored = db.type_coerce(Note.body, db.Text)
+    scanned = rewritten = 0
+    for _ in shards.each():
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                db.select(Note.id, stored).where(Note.id > last_id).order_by(Note.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            for note_id, raw in rows:
+                if raw is None:
+                    continue
+                value = decode_text(raw)
+                if encode_text(value, body_type.threshold, body_type.level, body_type.prefix_length) == raw:
+                    continue
+                result = db.session.execute(
+                    db.update(Note)
+                      .where(Note.id == note_id, stored == raw)
+                      .values(body=value, updated_at=Note.updated_at)
+                )
+                rewritten += result.rowcount
+            db.session.commit()
+            scanned += len(rows)
+            last_id = rows[-1][0]
+    return scanned, rewritten
+
+
+@notes_cli.command("compress-bodies")
+@click.option("--batch-size", default=200, show_default=True, help="Rows scanned per transaction.")
+def compress_bodies(batch_size):
+    """Compress large note bodies written before compression was enabled."""
+    scanned, rewritten = compress_note_bodies(batch_size=batch_size)
+    click.echo(f"Scanned {scanned} notes, compressed {rewritten}")
+
+
+@notes_cli.command("create-shards")
+def create_shards():
+    """Create the notes table on every configured shard (NOTES_SHARDS)."""
+    shards.create_tables()
+    click.echo(f"Notes tables ready on {shards.count} shard(s)")
+
+
+@notes_cli.command("reshard")
+@click.option("--from-count", type=int, required=True, help="Shard count the notes are currently stored with.")
+@click.option("--batch-size", default=500, show_default=True, help="Rows copied per transaction.")
+def reshard(from_count, batch_size):
+    """Move notes from a --from-count shard layout to the configured NOTES_SHARDS layout."""
+    moved = shards.reshard(from_count, batch_size=batch_size)
+    click.echo(f"Moved {moved} notes from {from_count} to {shards.count} shard(s)")
+
+
+@click.command("worker")
+@click.option("--threads", default=2, show_default=True, help="Worker threads.")
+@click.option("--drain", is_flag=True, help="Run every due job once, then exit.")
+@with_appcontext
+def worker(threads, drain):
+    """Run background jobs from the durable queue."""
+    app = current_app._get_current_object()
+    if drain:
+        click.echo(f"Ran {jobs.run_pending(app)} jobs")
+        return
+
+    app.config["JOBS_WORKERS"] = threads
+    jobs.start(app)
+    click.echo(f"Worker running with {threads} threads (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        jobs.shutdown(app)
+
+
+@profile_cli.command("token")
+def profile_token():
+    """Print a signed header that forces profiling of a request."""
+    click.echo(f"{PROFILE_HEADER}: {profiler.make_token()}")
+
+
+@profile_cli.command("report")
+@click.option("--dir", "directory", default=None, help="Profile directory (default: PROFILER_DIR).")
+@click.option("--out", default=None, help="Where merged files go (default: <dir>/../profile-report).")
+@click.option("--top", default=15, show_default=True, help="Functions listed per endpoint.")
+def profile_report(directory, out, top):
+    """Aggregate per-request profiles into per-endpoint, flamegraph-ready files."""
+    directory = directory or current_app.config["PROFILER_DIR"]
+    if not os.path.isdir(directory):
+        raise click.ClickException(f"No profiles in {directory}")
+    out = out or os.path.join(os.path.dirname(os.path.abspath(directory)), "profile-report")
+    for entry in aggregate_profiles(directory, out, top=top):
+        click.echo(f"== {entry['endpoint']}: {entry['requests']} requests, "
+                   f"mean {entry['mean_ms']:.1f} ms, max {entry['max_ms']:.1f} ms")
+        click.echo(entry["summary"])
+    click.echo(f"Merged files written to {out}")
+
@@ -1,11 +1,21 @@
 # app/extensions.py
 # Centralized extension initialization.
-# Holds instances of db, migrate, bcrypt for import in other modules.
+# Holds instances of db, migrate, bcrypt, response_cache, jobs, shards, profiler, admission for import in other modules.
 
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_bcrypt import Bcrypt
+from .admission import AdmissionControl
+from .cache import ResponseCache
+from .jobs import JobQueue
+from .profiling import RequestProfiler
+from .sharding import NoteShards, ShardRoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": ShardRoutingSession})
 migrate = Migrate()
-bcrypt = Bcrypt()
\ No newline at end of file
+bcrypt = Bcrypt()
+response_cache = ResponseCache()
+jobs = JobQueue(db=db)
+shards = NoteShards()
+profiler = RequestProfiler()
+admission = AdmissionControl()
@@ -0,0 +1,178 @@
+# app/idempotency.py
+# Idempotency-Key support for retry-safe POST endpoints.
+# - The first request with a key claims it, runs the handler, and stores status + body
+# - Views call stage_response() before their commit so the stored response commits with the
+#   handler's own writes; otherwise it is stored in a second transaction after the view returns,
+#   and a crash in between lets a retry run the handler again once the key is abandoned.
+#   With sharded notes the key (default database) and the note (its shard) commit one after the
+#   other, so a narrow window remains there.
+# - Replays within IDEMPOTENCY_TTL_SECONDS return the stored response without re-running the handler
+# - A duplicate that arrives while the first is still running waits for it instead of racing
+#   (an in-flight key older than IDEMPOTENCY_LOCK_SECONDS is treated as abandoned)
+# - Keys are scoped per user (or per client IP when logged out); reusing a key with a different
+#   payload is rejected with 422
+# - Expired keys are evicted in batches by the "idempotency.purge_expired" background job
+
+import hashlib
+import hmac
+import time
+from datetime import timedelta
+from functools import wraps
+from flask import current_app, g, request, Response
+from flask_login import current_user
+from sqlalchemy.exc import IntegrityError
+from .extensions import db, jobs
+from .models import IdempotencyKey
+from .sync import db_now
+
+HEADER = "Idempotency-Key"
+
+
+def _scope():
+    if current_user.is_authenticated:
+        return f"user:{current_user.id}"
+    return f"ip:{request.remote_addr}"
+
+
+def _fingerprint():
+    # Keyed hash: request bodies can contain passwords
+    secret = current_app.config["SECRET_KEY"].encode()
+    payload = f"{request.method} {request.path}\n".encode() + request.get_data()
+    return hmac.new(secret, payload, hashlib.sha256).hexdigest()
+
+
+def _ttl():
+    return timedelta(seconds=current_app.config["IDEMPOTENCY_TTL_SECONDS"])
+
+
+def _find(scope, key):
+    return db.session.scalars(
+        db.select(IdempotencyKey).filter_by(scope=scope, key=key)
+    ).first()
+
+
+def _claim(scope, key, fingerprint):
+    """Insert an in-flight row for the key. Returns True if this request owns it."""
+    db.session.add(IdempotencyKey(scope=scope, key=key, fingerprint=fingerprint))
+    try:
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+
+def _replay(record, on_replay):
+    if on_replay is not None:
+        on_replay(record)
+    resp = Response(record.body, status=record.status, mimetype="application/json")
+    resp.headers["Idempotent-Replayed"] = "true"
+    return resp
+
+
+def _store(scope, key, resp):
+    db.session.execute(
+        db.update(IdempotencyKey)
+          .filter_by(scope=scope, key=key)
+          .values(status=resp.status_code, body=resp.get_data(as_text=True))
+    )
+    jobs.enqueue("idempotency.purge_expired", unique=True)
+
+
+def stage_response(rv):
+    """
+    Store the view's response for its Idempotency-Key on the current session, so it commits
+    in the same transaction as the handler's writes.
+    - Call just before the view commits, with the value the view will return.
+    - Does nothing for requests without a key.
+    """
+    claimed = g.get("idempotency_key")
+    if claimed is None:
+        return rv
+    _store(*claimed, current_app.make_response(rv))
+    g.idempotency_staged = True
+    return rv
+
+
+def idempotent(on_replay=None):
+    """
+    Make a POST view safe to retry with an Idempotency-Key header.
+    - Requests without the header run normally.
+    - Views should call stage_response() before committing (see the module header).
+    - on_replay(record) runs before a stored response is replayed (e.g. to restore a login).
+    - Responses with status >= 500 (or exceptions) release the key so the client can retry.
+    - Returns 409 if a duplicate is still in flight after IDEMPOTENCY_WAIT_SECONDS,
+      422 if the key was used with a different payload.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return view(*args, **kwargs)
+            if len(key) > 255:
+                return {"error": f"{HEADER} must be at most 255 characters."}, 400
+
+            scope, fingerprint = _scope(), _fingerprint()
+            deadline = time.monotonic() + current_app.config["IDEMPOTENCY_WAIT_SECONDS"]
+
+            while not _claim(scope, key, fingerprint):
+                record = _find(scope, key)
+                if record is None:
+                    continue  # released or evicted between our insert and read
+                if record.fingerprint != fingerprint:
+                    return {"error": f"{HEADER} was already used with a different request."}, 422
+                age = db_now() - record.created_at
+                abandoned = record.status is None and \
+                    age > timedelta(seconds=current_app.config["IDEMPOTENCY_LOCK_SECONDS"])
+                if age > _ttl() or abandoned:
+                    db.session.delete(record)
+                    db.session.commit()
+                    continue
+                if record.status is not None:
+                    return _replay(record, on_replay)
+                if time.monotonic() >= deadline:
+                    return {"error": "A request with this Idempotency-Key is still in progress."}, 409
+                db.session.rollback()  # end the read so the next poll sees fresh rows
+                time.sleep(current_app.config["IDEMPOTENCY_POLL_SECONDS"])
+
+            g.idempotency_key = (scope, key)
+            try:
+                resp = current_app.make_response(view(*args, **kwargs))
+            except Exception:
+                db.session.rollback()
+                db.session.execute(db.delete(IdempotencyKey).filter_by(scope=scope, key=key))
+                db.session.commit()
+                raise
+            finally:
+                g.pop("idempotency_key", None)
+                staged = g.pop("idempotency_staged", False)
+
+            if resp.status_code >= 500:
+                db.session.execute(db.delete(IdempotencyKey).filter_by(scope=scope, key=key))
+            elif not staged:
+                _store(scope, key, resp)
+            db.session.commit()
+            return resp
+
+        return wrapper
+    return decorator
+
+
+@jobs.job("idempotency.purge_expired")
+def purge_expired_keys(batch_size=500):
+    """Delete idempotency keys past their TTL in batches. Returns the number removed."""
+    cutoff = db_now() - _ttl()
+    purged = 0
+    while True:
+        ids = db.session.scalars(
+            db.select(IdempotencyKey.id).where(IdempotencyKey.created_at < cutoff).limit(batch_size)
+        ).all()
+        if not ids:
+            break
+        db.session.execute(db.delete(IdempotencyKey).where(IdempotencyKey.id.in_(ids)))
+        db.session.commit()
+        purged += len(ids)
+        if len(ids) < batch_size:
+            break
+    return purged
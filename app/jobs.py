@@ -0,0 +1,276 @@
+# app/jobs.py
+# Background job subsystem for deferred, post-commit work.
+# - jobs.enqueue(...) inside a request queues work on the current db session
+# - Queued jobs are persisted only after the session commits (dropped on rollback)
+# - SQLiteJobStore: durable queue in its own SQLite file, with leases for crash recovery
+# - Workers: in-process thread pool (started lazily) or `python manage.py worker`
+# - Jobs can be delayed (run_at); a claimed job is 'running' until it completes or its lease expires
+# - Failures are retried with exponential backoff, then parked as 'failed'
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from flask import current_app
+from sqlalchemy import event
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_at REAL NOT NULL,
+    locked_until REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status_run_at ON jobs (status, run_at);
+"""
+
+
+class SQLiteJobStore:
+    """
+    Durable job queue backed by a SQLite file.
+    - claim() leases a job and marks it 'running'; a worker that dies mid-job lets the
+      lease expire and the job becomes claimable again.
+    - One connection per thread.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def push(self, name, payload, unique=False, run_at=None):
+        """Insert a job. With unique=True, skip it if a pending job of the same name exists."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if unique and conn.execute(
+                "SELECT 1 FROM jobs WHERE name = ? AND status = 'pending' LIMIT 1", (name,)
+            ).fetchone():
+                conn.execute("COMMIT")
+                return None
+            cur = conn.execute(
+                "INSERT INTO jobs (name, payload, run_at) VALUES (?, ?, ?)",
+                (name, json.dumps(payload), run_at or time.time()),
+            )
+            conn.execute("COMMIT")
+            return cur.lastrowid
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def claim(self, lease_seconds):
+        """Lease the next due job (or one whose lease expired). Returns (id, name, payload, attempts) or None."""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, name, payload, attempts FROM jobs"
+                " WHERE (status = 'pending' AND run_at <= ?)"
+                " OR (status = 'running' AND locked_until <= ?)"
+                " ORDER BY run_at, id LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', locked_until = ?, attempts = attempts + 1"
+                    " WHERE id = ?",
+                    (now + lease_seconds, row[0]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        job_id, name, payload, attempts = row
+        return job_id, name, json.loads(payload), attempts + 1
+
+    def complete(self, job_id):
+        self._connect().execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def fail(self, job_id, attempts, error, max_attempts, backoff_seconds):
+        """Schedule a retry with exponential backoff, or park the job once attempts run out."""
+        conn = self._connect()
+        if attempts >= max_attempts:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', locked_until = NULL, last_error = ? WHERE id = ?",
+                (error, job_id),
+            )
+        else:
+            conn.execute(
+                "UPDATE jobs SET status = 'pending', run_at = ?, locked_until = NULL, last_error = ?"
+                " WHERE id = ?",
+                (time.time() + backoff_seconds * 2 ** (attempts - 1), error, job_id),
+            )
+
+    def counts(self):
+        """Return {status: count} for jobs still in the queue."""
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+        return dict(rows.fetchall())
+
+
+class _JobState:
+    """Per-app queue state: store, worker threads, wakeup signal."""
+
+    def __init__(self, app):
+        self.app = app
+        os.makedirs(os.path.dirname(app.config["JOBS_DATABASE"]) or ".", exist_ok=True)
+        self.store = SQLiteJobStore(app.config["JOBS_DATABASE"])
+        self.wakeup = threading.Event()
+        self.stop = threading.Event()
+        self.threads = []
+        self.lock = threading.Lock()
+
+
+class JobQueue:
+    """
+    Flask extension for post-commit background jobs.
+    - Register handlers with @jobs.job("name"); payloads must be JSON-serializable kwargs.
+    - Config: JOBS_DATABASE, JOBS_WORKERS (0 = no in-process workers), JOBS_MAX_ATTEMPTS,
+      JOBS_BACKOFF_SECONDS, JOBS_LEASE_SECONDS, JOBS_POLL_SECONDS.
+    """
+
+    def __init__(self, app=None, db=None):
+        self.registry = {}
+        self.db = db
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("JOBS_DATABASE", os.path.join(app.instance_path, "jobs.db"))
+        app.config.setdefault("JOBS_WORKERS", 2)
+        app.config.setdefault("JOBS_MAX_ATTEMPTS", 5)
+        app.config.setdefault("JOBS_BACKOFF_SECONDS", 2)
+        app.config.setdefault("JOBS_LEASE_SECONDS", 300)
+        app.config.setdefault("JOBS_POLL_SECONDS", 1)
+        app.extensions["jobs"] = None  # store is opened lazily so config can be overridden
+
+        if not event.contains(self.db.session, "after_commit", self._after_commit):
+            event.listen(self.db.session, "after_commit", self._after_commit)
+            event.listen(self.db.session, "after_soft_rollback", self._after_rollback)
+
+    # --- Registration / enqueueing ---
+
+    def job(self, name):
+        """Decorator registering a job handler under `name`."""
+        def decorator(fn):
+            self.registry[name] = fn
+            return fn
+        return decorator
+
+    def enqueue(self, name, unique=False, delay=0, **payload):
+        """
+        Queue a job to run after the current db session commits.
+        - unique=True skips it if a job of the same name is already waiting to run
+          (a running job does not count).
+        - delay: seconds after the commit before the job is due.
+        - Dropped if the session rolls back instead.
+        """
+        if name not in self.registry:
+            raise KeyError(f"Unknown job: {name}")
+        session = self.db.session()
+        if not session.in_transaction():
+            session.begin()  # so a bare rollback() still fires after_soft_rollback
+        session.info.setdefault("pending_jobs", []).append((name, payload, unique, delay))
+
+    def _after_commit(self, session):
+        pending = session.info.pop("pending_jobs", None)
+        if not pending:
+            return
+        state = self.state()
+        for name, payload, unique, delay in pending:
+            state.store.push(name, payload, unique=unique, run_at=time.time() + delay)
+        self.start()
+        state.wakeup.set()
+
+    def _after_rollback(self, session, previous_transaction):
+        # A savepoint rollback leaves the outer transaction (and its jobs) alive
+        if not session.in_transaction():
+            session.info.pop("pending_jobs", None)
+
+    # --- Execution ---
+
+    def state(self, app=None):
+        app = app or current_app._get_current_object()
+        state = app.extensions.get("jobs")
+        if state is None:
+            state = app.extensions["jobs"] = _JobState(app)
+        return state
+
+    def run_one(self, app=None):
+        """Claim and run a single due job. Returns False if none were due."""
+        state = self.state(app)
+        app = state.app
+        claimed = state.store.claim(app.config["JOBS_LEASE_SECONDS"])
+        if claimed is None:
+            return False
+
+        job_id, name, payload, attempts = claimed
+        try:
+            with app.app_context():
+                self.registry[name](**payload)
+        except Exception as exc:
+            log.exception("Job %s (%s) failed on attempt %s", job_id, name, attempts)
+            state.store.fail(
+                job_id, attempts, repr(exc),
+                app.config["JOBS_MAX_ATTEMPTS"], app.config["JOBS_BACKOFF_SECONDS"],
+            )
+        else:
+            state.store.complete(job_id)
+        return True
+
+    def run_pending(self, app=None):
+        """Run due jobs until the queue has none left. Returns the number run."""
+        ran = 0
+        while self.run_one(app):
+            ran += 1
+        return ran
+
+    def work(self, app=None, stop=None):
+        """Worker loop: run jobs as they come due until `stop` is set."""
+        state = self.state(app)
+        stop = stop or state.stop
+        while not stop.is_set():
+            if not self.run_one(state.app):
+                state.wakeup.wait(state.app.config["JOBS_POLL_SECONDS"])
+                state.wakeup.clear()
+
+    def start(self, app=None):
+        """Start the in-process worker threads (once per app) if JOBS_WORKERS > 0."""
+        state = self.state(app)
+        with state.lock:
+            if state.threads or state.app.config["JOBS_WORKERS"] <= 0:
+                return
+            for i in range(state.app.config["JOBS_WORKERS"]):
+                thread = threading.Thread(
+                    target=self.work, args=(state.app,), name=f"jobs-worker-{i}", daemon=True
+                )
+                thread.start()
+                state.threads.append(thread)
+
+    def shutdown(self, app=None, timeout=5):
+        """Signal in-process workers to stop and wait for them."""
+        state = self.state(app)
+        state.stop.set()
+        state.wakeup.set()
+        for thread in state.threads:
+            thread.join(timeout)
+        state.threads = []
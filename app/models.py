@@ -2,10 +2,27 @@
 # SQLAlchemy models.
 # - User model: unique email, bcrypt password hashing, Flask-Login integration
 # - Note model: user-owned resource with title, body, and timestamp fields (created_at, updated_at)
+# - Notes are soft-deleted (deleted_at) so sync clients can receive tombstones
+# - Every note write takes the next change_seq from NoteChangeCounter, in commit order (see sync.py)
+# - Note.body is compressed at rest above a size threshold (see types.CompressedText)
+# - IdempotencyKey stores first responses for retried POSTs (see idempotency.py)
+# - NoteIdAllocator hands out globally unique note IDs when notes are sharded (see sharding.py)
 
 from flask_login import UserMixin
 from datetime import datetime
-from .extensions import db, bcrypt
+from sqlalchemy import event
+from sqlalchemy.dialects import sqlite
+from .extensions import db, bcrypt, shards
+from .types import CompressedText, ESCAPED, MARKERS, PREFIXED
+
+# SQLite stores CURRENT_TIMESTAMP as "YYYY-MM-DD HH:MM:SS" text; bind Python datetimes
+# in the same format so bound values (e.g. tombstone cutoffs) compare correctly with server-stamped ones.
+Timestamp = db.DateTime().with_variant(
+    sqlite.DATETIME(
+        storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"
+    ),
+    "sqlite",
+)
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -20,16 +37,126 @@ class User(UserMixin, db.Model):
 
 class Note(db.Model):
     __tablename__ = "notes"
+    __table_args__ = (
+        # Delta sync scans a user's changes in change_seq order
+        db.Index("ix_notes_user_id_change_seq", "user_id", "change_seq"),
+        # Tombstone purge range-scans deleted_at; live rows (NULL) sit apart at one end
+        db.Index("ix_notes_deleted_at", "deleted_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     title = db.Column(db.String(120), nullable=False)
-    body = db.Column(db.Text)
+    body = db.Column(CompressedText(threshold=1024))
 
-    created_at = db.Column(db.DateTime, default=db.func.now(), nullable=False)
+    created_at = db.Column(Timestamp, default=db.func.now(), nullable=False)
     updated_at = db.Column(
-        db.DateTime,
+        Timestamp,
         default=db.func.now(),
         onupdate=db.func.now(),
         nullable=False
     )
+    deleted_at = db.Column(Timestamp, nullable=True)
+    change_seq = db.Column(db.Integer, nullable=False)  # set on every insert/update, see below
+
+    @classmethod
+    def live(cls):
+        """Query for notes that have not been soft-deleted."""
+        return cls.query.filter(cls.deleted_at.is_(None))
+
+    def soft_delete(self):
+        """Mark the note deleted; the row is kept as a tombstone until purged."""
+        self.deleted_at = db.func.now()
+
+    @classmethod
+    def preview_expr(cls, length):
+        """
+        SQL expression for the first `length` characters of body.
+        - Plain, escaped, and compressed rows (from their plain head) are truncated in SQL.
+        - Only previews longer than the compressed head, or compressed rows written before
+          heads existed, return the stored value to be decoded and truncated in Python.
+        """
+        stored = db.type_coerce(cls.body, db.Text)
+        marker = db.func.substr(stored, 1, 1)
+        # Re-mark SQL-truncated heads as escaped so the column type passes them through
+        head = db.literal(ESCAPED, db.Text) + db.func.substr(stored, 2, length)
+        whens = [(marker == ESCAPED, head)]
+        if length <= cls.body.type.prefix_length:
+            whens.append((marker == PREFIXED, head))
+        whens.append((marker.in_(MARKERS), stored))
+        return db.type_coerce(
+            db.case(*whens, else_=db.func.substr(stored, 1, length)),
+            cls.body.type,
+        )
+
+
+@event.listens_for(Note, "before_insert")
+def assign_note_id(mapper, connection, target):
+    """Sharded notes take their ID from the allocator; unsharded ones use autoincrement."""
+    if target.id is None:
+        target.id = shards.next_id()
+    target.change_seq = next_change_seq(connection)
+
+
+@event.listens_for(Note, "before_update")
+def bump_change_seq(mapper, connection, target):
+    """Give every modified note a new change_seq so delta sync picks it up."""
+    if db.object_session(target).is_modified(target, include_collections=False):
+        target.change_seq = next_change_seq(connection)
+
+
+class NoteIdAllocator(db.Model):
+    __tablename__ = "note_id_allocator"
+
+    id = db.Column(db.Integer, primary_key=True)
+    next_id = db.Column(db.Integer, nullable=False)
+
+
+class NoteChangeCounter(db.Model):
+    """
+    Single-row change sequence, stored next to the notes table (one per shard).
+    - last_seq: the last change_seq handed out
+    - purged_seq: the highest change_seq of a purged tombstone; older sync tokens get 410
+    """
+    __tablename__ = "note_change_counter"
+
+    id = db.Column(db.Integer, primary_key=True)
+    last_seq = db.Column(db.Integer, nullable=False)
+    purged_seq = db.Column(db.Integer, nullable=False)
+
+
+@event.listens_for(NoteChangeCounter.__table__, "after_create")
+def seed_change_counter(target, connection, **kw):
+    connection.execute(target.insert().values(id=1, last_seq=0, purged_seq=0))
+
+
+def next_change_seq(connection):
+    """
+    Bump the change counter on the connection that is writing the note.
+    - The row lock is held until the writing transaction commits, so change_seq
+      values become visible in increasing order and a sync token never skips one.
+    - Creates the row if it is missing (e.g. a database upgraded by hand rather than built
+      by create_all), continuing after the highest change_seq already stored.
+    """
+    table = NoteChangeCounter.__table__
+    bumped = connection.execute(
+        db.update(table).where(table.c.id == 1).values(last_seq=table.c.last_seq + 1)
+    )
+    if not bumped.rowcount:
+        last_seq = connection.scalar(db.select(db.func.coalesce(db.func.max(Note.change_seq), 0)))
+        connection.execute(table.insert().values(id=1, last_seq=last_seq + 1, purged_seq=0))
+    return connection.scalar(db.select(table.c.last_seq).where(table.c.id == 1))
+
+
+class IdempotencyKey(db.Model):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (db.UniqueConstraint("scope", "key"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(64), nullable=False)   # "user:<id>" or "ip:<addr>"
+    key = db.Column(db.String(255), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.Integer)                      # NULL while the first request is in flight
+    body = db.Column(db.Text)
+    created_at = db.Column(Timestamp, default=db.func.now(), nullable=False, index=True)
+
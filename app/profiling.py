@@ -0,0 +1,211 @@
+# app/profiling.py
+# Opt-in sampling request profiler.
+# - Profiles 1 in PROFILER_SAMPLE_RATE requests, plus any request carrying a signed X-Profile header
+# - PROFILER_MODE "cprofile" writes .pstats files; "sampler" writes flamegraph-ready .collapsed stacks
+# - Dumps go to PROFILER_DIR/<endpoint>/, keeping the newest PROFILER_MAX_FILES per endpoint
+# - Unsampled requests pay one counter increment and a header lookup
+# - `flask profile token` prints a header value; `flask profile report` aggregates the dumps
+
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from flask import current_app, g, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+HEADER = "X-Profile"
+
+
+class StackSampler:
+    """Low-overhead wall-clock sampler: snapshots one thread's stack every `interval` seconds."""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, "w") as fh:
+            for stack, count in self.stacks.most_common():
+                fh.write(f"{stack} {count}\n")
+
+
+class RequestProfiler:
+    """
+    Flask extension for per-request profiling.
+    - Config: PROFILER_ENABLED, PROFILER_SAMPLE_RATE (0 = header only), PROFILER_MODE,
+      PROFILER_DIR, PROFILER_MAX_FILES, PROFILER_TOKEN_MAX_AGE.
+    - When disabled no hooks are registered at all.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("PROFILER_ENABLED", False)
+        app.config.setdefault("PROFILER_SAMPLE_RATE", 100)
+        app.config.setdefault("PROFILER_MODE", "cprofile")
+        app.config.setdefault("PROFILER_DIR", os.path.join(app.instance_path, "profiles"))
+        app.config.setdefault("PROFILER_MAX_FILES", 50)
+        app.config.setdefault("PROFILER_TOKEN_MAX_AGE", 3600)
+        if not app.config["PROFILER_ENABLED"]:
+            return
+
+        app.extensions["profiler"] = itertools.count(1)
+        app.before_request(self._start)
+        app.teardown_request(self._stop)
+
+    # --- Signed debug header ---
+
+    def _serializer(self):
+        return URLSafeTimedSerializer(current_app.config["SECRET_KEY"], salt="request-profiler")
+
+    def make_token(self):
+        """Signed X-Profile header value, valid for PROFILER_TOKEN_MAX_AGE seconds."""
+        return self._serializer().dumps("profile")
+
+    def _header_ok(self):
+        token = request.headers.get(HEADER)
+        if not token:
+            return False
+        try:
+            self._serializer().loads(token, max_age=current_app.config["PROFILER_TOKEN_MAX_AGE"])
+            return True
+        except BadSignature:
+            return False
+
+    # --- Hooks ---
+
+    def _should_sample(self):
+        rate = current_app.config["PROFILER_SAMPLE_RATE"]
+        n = next(current_app.extensions["profiler"])
+        return (rate > 0 and n % rate == 0) or self._header_ok()
+
+    def _start(self):
+        if not self._should_sample():
+            return
+        if current_app.config["PROFILER_MODE"] == "sampler":
+            profile = StackSampler(threading.get_ident())
+            profile.start()
+        else:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                return  # another request in this process is already being profiled
+        g.request_profile = (profile, time.perf_counter())
+
+    def _stop(self, exc=None):
+        started = g.pop("request_profile", None)
+        if started is None:
+            return
+        profile, t0 = started
+        if isinstance(profile, StackSampler):
+            profile.stop()
+        else:
+            profile.disable()
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        self._dump(profile, elapsed_ms)
+
+    def _dump(self, profile, elapsed_ms):
+        endpoint = (request.endpoint or "unmatched").replace("/", "_")
+        directory = os.path.join(current_app.config["PROFILER_DIR"], endpoint)
+        os.makedirs(directory, exist_ok=True)
+        stem = f"{time.time_ns()}-{os.getpid()}-{threading.get_ident()}-{elapsed_ms:.0f}ms"
+        if isinstance(profile, StackSampler):
+            profile.dump(os.path.join(directory, f"{stem}.collapsed"))
+        else:
+            profile.dump_stats(os.path.join(directory, f"{stem}.pstats"))
+        self._rotate(directory)
+
+    def _rotate(self, directory):
+        files = sorted(os.listdir(directory))  # names start with a nanosecond timestamp
+        for old in files[:-current_app.config["PROFILER_MAX_FILES"]]:
+            try:
+                os.remove(os.path.join(directory, old))
+            except FileNotFoundError:
+                pass  # rotated by a concurrent request
+
+
+def aggregate_profiles(directory, out_dir, top=15):
+    """
+    Merge per-request dumps into one report per endpoint.
+    - .pstats files -> <endpoint>.pstats (load with pstats/snakeviz) plus a top-N text summary
+    - .collapsed files -> <endpoint>.collapsed, ready for flamegraph.pl / speedscope
+    - Returns a list of dicts: endpoint, requests, mean_ms, max_ms, summary.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    report = []
+    for endpoint in sorted(os.listdir(directory)):
+        path = os.path.join(directory, endpoint)
+        if not os.path.isdir(path) or os.path.abspath(path) == os.path.abspath(out_dir):
+            continue
+        files = sorted(os.listdir(path))
+        latencies = [float(f.rsplit("-", 1)[-1].split("ms")[0]) for f in files if "ms." in f]
+        entry = {
+            "endpoint": endpoint,
+            "requests": len(files),
+            "mean_ms": sum(latencies) / len(latencies) if latencies else 0.0,
+            "max_ms": max(latencies, default=0.0),
+            "summary": "",
+        }
+
+        pstats_files = [os.path.join(path, f) for f in files if f.endswith(".pstats")]
+        if pstats_files:
+            buf = io.StringIO()
+            stats = pstats.Stats(*pstats_files, stream=buf)
+            stats.dump_stats(os.path.join(out_dir, f"{endpoint}.pstats"))
+            stats.strip_dirs().sort_stats("cumulative").print_stats(top)
+            entry["summary"] = buf.getvalue()
+
+        stacks = Counter()
+        for f in files:
+            if f.endswith(".collapsed"):
+                with open(os.path.join(path, f)) as fh:
+                    for line in fh:
+                        stack, _, count = line.rstrip("\n").rpartition(" ")
+                        if stack:
+                            stacks[stack] += int(count)
+        if stacks:
+            with open(os.path.join(out_dir, f"{endpoint}.collapsed"), "w") as fh:
+                for stack, count in stacks.most_common():
+                    fh.write(f"{stack} {count}\n")
+            hottest = "\n".join(f"{count:>8}  {stack.rsplit(';', 1)[-1]}"
+                                for stack, count in _leaf_totals(stacks).most_common(top))
+            entry["summary"] += f"Hottest frames (samples):\n{hottest}\n"
+
+        report.append(entry)
+    return report
+
+
+def _leaf_totals(stacks):
+    leaves = Counter()
+    for stack, count in stacks.items():
+        leaves[stack.rsplit(";", 1)[-1]] += count
+    return leaves
+
@@ -5,19 +5,31 @@
 # - /logout: Log out user
 # - /check_session: Return current logged-in user (or {} if none)
 
+import json
 from flask import Blueprint, request
 from flask_login import login_user, logout_user, login_required, current_user
 from ..models import User
 from ..extensions import db
+from ..idempotency import idempotent, stage_response
 from ..schemas import user_schema
 
 bp = Blueprint("auth", __name__)
 
+def restore_signup_session(record):
+    """On an idempotent signup replay, log the client in as the user the first request created."""
+    if record.status == 201:
+        user = db.session.get(User, json.loads(record.body)["id"])
+        if user:
+            login_user(user)
+
 @bp.post("/signup")
+@idempotent(on_replay=restore_signup_session)
 def signup():
     """
     Register a new user and start a session.
     - Requires 'username', 'password', and 'password_confirmation' in JSON body.
+    - Optional Idempotency-Key header: a retried signup replays the first response
+      (and restores the session) without hashing the password again.
     - Returns 201 with user data if successful.
     - Returns 400 if fields are missing, confirmation mismatch, or username already exists.
     """
@@ -35,10 +47,12 @@ def signup():
     user = User(email=data["username"])
     user.set_password(data["password"])
     db.session.add(user)
+    db.session.flush()
+    rv = stage_response(({"id": user.id, "username": user.email}, 201))
     db.session.commit()
     login_user(user)  # start a session automatically
 
-    return {"id": user.id, "username": user.email}, 201
+    return rv
 
 
 @bp.post("/login")
@@ -2,32 +2,96 @@
 # Notes resource routes (CRUD).
 # - /notes: List (with pagination) or create notes
 # - /notes/<id>: Retrieve, update, or delete individual notes
+# - /notes/changes: Delta sync (changed notes + tombstones since a change token)
 # - All routes require authentication and enforce user ownership
+# - Each request is routed to the current user's notes shard (see sharding.py)
 
 from flask import Blueprint, request
 from flask_login import login_required, current_user
-from ..extensions import db
+from sqlalchemy.orm import load_only
+from ..extensions import db, response_cache, shards
 from ..models import Note
-from ..schemas import note_schema, notes_schema
+from ..idempotency import idempotent, stage_response
+from ..schemas import note_schema, notes_schema, note_list_schema, NOTE_FIELDS
+from .. import sync
 
 bp = Blueprint("notes", __name__)
 
+@bp.before_request
+def route_to_shard():
+    """Send this request's notes queries to the current user's shard."""
+    if current_user.is_authenticated:
+        shards.route(current_user.id)
+
+def _find_live_note(note_id, action):
+    """
+    Load a live note owned by the current user, for the single-note routes.
+    - Returns (note, None), or (None, error response): 404 if no live note has this ID,
+      403 if it belongs to another user.
+    - Another user's note may sit on a different shard, so a miss on the caller's shard
+      is checked against every shard before answering 404.
+    """
+    note = db.session.get(Note, note_id)
+    if note is None or note.deleted_at is not None:
+        elsewhere = shards.count > 1 and shards.scatter_gather(
+            db.select(Note.id).where(Note.id == note_id, Note.deleted_at.is_(None))
+        )
+        if not elsewhere:
+            return None, ({"error": "Note not found"}, 404)
+    if note is None or note.user_id != current_user.id:
+        return None, ({"error": f"Not authorized to {action} this note."}, 403)
+    return note, None
+
 @bp.get("")
 @login_required
+@response_cache.cached
 def list_notes():
     """
     List notes for the current logged-in user.
     - Supports pagination with ?page=N&per_page=M.
+    - Supports projection with ?fields=id,title,updated_at (unlisted columns are never loaded).
+    - Supports ?preview=N: adds the first N characters of body, truncated in SQL.
+    - Responses are cached per user until their next note write.
     - Returns 200 with notes data and pagination metadata.
+    - Returns 400 for unknown fields or a non-positive preview length.
     """
     page = request.args.get("page", 1, type=int)
     per_page = request.args.get("per_page", 10, type=int)
 
-    pagination = Note.query.filter_by(user_id=current_user.id)\
-                           .paginate(page=page, per_page=per_page, error_out=False)
+    only = None
+    if "fields" in request.args:
+        only = tuple(dict.fromkeys(
+            f.strip() for f in request.args["fields"].split(",") if f.strip()
+        ))
+        unknown = [f for f in only if f not in NOTE_FIELDS]
+        if unknown:
+            return {"error": f"Unknown fields: {', '.join(unknown)}."}, 400
+        if not only:
+            return {"error": "At least one field is required."}, 400
+
+    preview = None
+    if "preview" in request.args:
+        preview = request.args.get("preview", type=int)
+        if not preview or preview < 1:
+            return {"error": "Preview length must be a positive integer."}, 400
+
+    query = Note.live().filter_by(user_id=current_user.id)
+    if only is not None:
+        query = query.options(load_only(*(getattr(Note, f) for f in only)))
+    if preview:
+        query = query.add_columns(Note.preview_expr(preview).label("preview"))
+
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+
+    if preview:
+        data = note_list_schema(only).dump([note for note, _ in pagination.items])
+        for item, (_, text) in zip(data, pagination.items):
+            item["preview"] = (text or "")[:preview]
+    else:
+        data = note_list_schema(only).dump(pagination.items)
 
     return {
-        "data": notes_schema.dump(pagination.items),
+        "data": data,
         "meta": {
             "page": pagination.page,
             "per_page": pagination.per_page,
@@ -37,12 +101,48 @@ def list_notes():
     }, 200
 
 
+@bp.get("/changes")
+@login_required
+def list_changes():
+    """
+    List notes created, updated, or deleted since a change token.
+    - Supports ?since=<token> (omit for a full initial sync) and ?limit=N (max 500).
+    - Returns 200 with changed notes, deleted note IDs, and the next token.
+    - Returns 400 if the token is malformed.
+    - Returns 410 if tombstones newer than the token were purged (client must resync).
+    """
+    since = request.args.get("since")
+    limit = max(1, min(request.args.get("limit", 100, type=int), 500))
+
+    cursor = None
+    if since:
+        try:
+            cursor = sync.decode_token(since)
+        except ValueError:
+            return {"error": "Invalid change token."}, 400
+        if sync.token_expired(cursor):
+            return {"error": "Change token expired; a full resync is required."}, 410
+
+    rows, has_more, next_token = sync.changes_since(current_user.id, cursor, limit)
+
+    return {
+        "data": notes_schema.dump([n for n in rows if n.deleted_at is None]),
+        "deleted": [n.id for n in rows if n.deleted_at is not None],
+        "meta": {
+            "next": next_token,
+            "has_more": has_more,
+        }
+    }, 200
+
+
 @bp.post("")
 @login_required
+@idempotent()
 def create_note():
     """
     Create a new note for the current logged-in user.
     - Requires at least 'title' in JSON body.
+    - Optional Idempotency-Key header: retries replay the first response instead of creating duplicates.
     - Returns 201 with created note on success.
     - Returns 400 if 'title' is missing or empty.
     """
@@ -53,8 +153,11 @@ def create_note():
 
     note = Note(user_id=current_user.id, title=data["title"], body=data.get("body", ""))
     db.session.add(note)
+    db.session.flush()
+    rv = stage_response((note_schema.dump(note), 201))
     db.session.commit()
-    return note_schema.dump(note), 201
+    response_cache.invalidate(current_user.id)
+    return rv
 
 
 @bp.get("/<int:note_id>")
@@ -63,14 +166,12 @@ def get_note(note_id):
     """
     Retrieve a single note by ID.
     - Returns 200 with the note if found and owned by the current user.
-    - Returns 403 if the note belongs to another user.
+    - Returns 403 if the note belongs to another user (on any shard).
     - Returns 404 if the note does not exist.
     """
-    note = db.session.get(Note, note_id)
-    if not note:
-        return {"error": "Note not found"}, 404
-    if note.user_id != current_user.id:
-        return {"error": "Not authorized to view this note."}, 403
+    note, error = _find_live_note(note_id, "view")
+    if error:
+        return error
     return note_schema.dump(note), 200
 
 
@@ -83,13 +184,12 @@ def update_note(id):
     - Requires JSON body with at least one of: 'title', 'body'
     - Returns 200 with the updated note on success
     - Returns 400 if no updatable fields are provided
-    - Returns 403 if the note does not belong to the current user
+    - Returns 403 if the note does not belong to the current user (on any shard)
     - Returns 404 if the note is not found
     """
-    note = db.session.get(Note, id)
-
-    if note.user_id != current_user.id:
-        return {"error": "Not authorized to update this note."}, 403
+    note, error = _find_live_note(id, "update")
+    if error:
+        return error
 
     data = request.get_json() or {}
 
@@ -102,6 +202,7 @@ def update_note(id):
         note.body = data["body"]
 
     db.session.commit()
+    response_cache.invalidate(current_user.id)
     return note_schema.dump(note), 200
 
 
@@ -112,14 +213,18 @@ def delete_note(note_id):
     Delete a note owned by the current logged-in user.
     - Requires the note ID in the URL path.
     - Only deletes the note if it belongs to the current user.
+    - Soft-deletes: the row stays as a sync tombstone until purged (a background job is
+      scheduled for when it leaves the retention window).
     - Returns 204 with an empty body if successful.
     - Returns 404 if the note does not exist or does not belong to the user.
     """
-    note = Note.query.filter_by(id=note_id, user_id=current_user.id).first()
+    note = Note.live().filter_by(id=note_id, user_id=current_user.id).first()
     if not note:
         return {"error": "Note not found"}, 404
-    db.session.delete(note)
+    note.soft_delete()
+    sync.schedule_purge(delay=sync.retention().total_seconds())
     db.session.commit()
+    response_cache.invalidate(current_user.id)
     return {}, 204
 
 notes_bp = bp
\ No newline at end of file
@@ -1,6 +1,8 @@
 # app/schemas.py
 # Marshmallow schemas for serializing User and Note models into JSON.
+# - note_list_schema(only): cached projected schemas for ?fields= list requests
 
+from functools import lru_cache
 from marshmallow import Schema, fields
 
 class UserSchema(Schema):
@@ -11,7 +13,16 @@ class NoteSchema(Schema):
     id = fields.Int(dump_only=True)
     title = fields.Str(required=True)
     body = fields.Str()
+    created_at = fields.DateTime(dump_only=True)
+    updated_at = fields.DateTime(dump_only=True)
 
 user_schema = UserSchema()
 note_schema = NoteSchema()
 notes_schema = NoteSchema(many=True)
+
+NOTE_FIELDS = tuple(NoteSchema().fields)
+
+@lru_cache(maxsize=32)
+def note_list_schema(only=None):
+    """Return a many=True NoteSchema restricted to `only` (a tuple of field names)."""
+    return NoteSchema(many=True, only=only)
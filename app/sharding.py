@@ -0,0 +1,326 @@
+# app/sharding.py
+# User-sharded note storage.
+# - NOTES_SHARDS=N (>1) spreads the notes table over N binds ("notes_0" ... "notes_{N-1}")
+# - A user's notes live on shard crc32(user_id) % N; the notes blueprint routes each request there
+# - ShardRoutingSession sends every notes-table (and change-counter) statement to the routed shard;
+#   other tables use the default bind
+# - Note IDs come from a block allocator in the default database so they stay unique across shards
+# - scatter_gather()/each() for jobs and reports that span every shard; reshard() to change N
+#
+# With NOTES_SHARDS=1 (the default) notes stay in the default database and nothing is routed.
+
+import itertools
+import os
+import threading
+import zlib
+from collections import defaultdict
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+import sqlalchemy.exc as sa_exc
+from flask import current_app, g
+from flask_sqlalchemy.session import Session
+
+NOTES_TABLE = "notes"
+SHARDED_TABLES = {NOTES_TABLE, "note_change_counter"}
+SHARD_BIND = "notes_{}"
+
+
+def shard_for(user_id, count):
+    """Stable shard index for a user (independent of Python's per-process hash seed)."""
+    if count <= 1:
+        return 0
+    return zlib.crc32(str(user_id).encode()) % count
+
+
+def _touches_notes(mapper, clause):
+    if mapper is not None:
+        return getattr(sa.inspect(mapper).local_table, "name", None) in SHARDED_TABLES
+    if isinstance(clause, sa.Table):
+        return clause.name in SHARDED_TABLES
+    if isinstance(clause, sa.sql.dml.UpdateBase):
+        return getattr(clause.table, "name", None) in SHARDED_TABLES
+    return False
+
+
+class ShardRoutingSession(Session):
+    """Flask-SQLAlchemy session that routes notes-table statements to the current shard."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _touches_notes(mapper, clause):
+            engine = current_app.extensions["notes_shards"].current_engine()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@sa.event.listens_for(ShardRoutingSession, "after_commit")
+def _share_reserved_ids(session):
+    # The block's reservation is committed, so other sessions may draw from it now
+    ids = session.info.pop("note_ids", None)
+    if ids is not None:
+        state = current_app.extensions["notes_shards"]
+        with state.lock:
+            state.ids = itertools.chain(state.ids, ids)
+
+
+@sa.event.listens_for(ShardRoutingSession, "after_soft_rollback")
+def _drop_reserved_ids(session, previous_transaction):
+    # The reservation rolled back with the transaction; another process may hand out the same IDs
+    if not session.in_transaction():
+        session.info.pop("note_ids", None)
+
+
+class _ShardState:
+    """Per-app shard state: ad-hoc engines (resharding) and the local ID block."""
+
+    def __init__(self, shards):
+        self.shards = shards
+        self.engines = {}
+        self.ids = iter(())
+        self.lock = threading.Lock()
+
+    def current_engine(self):
+        count = current_app.config["NOTES_SHARDS"]
+        if count <= 1:
+            return None
+        index = g.get("notes_shard")
+        if index is None:
+            raise RuntimeError("Notes query outside a shard context; wrap it in shards.using(user_id).")
+        return self.shards.engine(index)
+
+
+class NoteShards:
+    """
+    Flask extension for user-sharded notes. Must be initialized before db.
+    - Config: NOTES_SHARDS, NOTES_SHARD_URL (format string with {shard}), NOTES_ID_BLOCK_SIZE.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("NOTES_SHARDS", 1)
+        app.config.setdefault("NOTES_SHARD_URL", "sqlite:///notes_{shard}.db")
+        app.config.setdefault("NOTES_ID_BLOCK_SIZE", 100)
+        count = app.config["NOTES_SHARDS"]
+        if count > 1:
+            binds = app.config.setdefault("SQLALCHEMY_BINDS", {})
+            for index in range(count):
+                binds.setdefault(SHARD_BIND.format(index), app.config["NOTES_SHARD_URL"].format(shard=index))
+        app.extensions["notes_shards"] = _ShardState(self)
+
+    @property
+    def count(self):
+        return current_app.config["NOTES_SHARDS"]
+
+    @property
+    def _db(self):
+        return current_app.extensions["sqlalchemy"]
+
+    # --- Routing ---
+
+    def shard_for(self, user_id, count=None):
+        return shard_for(user_id, count or self.count)
+
+    def engine(self, index, count=None):
+        """Engine for shard `index` of an N-shard layout (N=1 is the default database)."""
+        count = count or self.count
+        db = self._db
+        if count <= 1:
+            return db.engine
+        key = SHARD_BIND.format(index)
+        if key in db.engines:
+            return db.engines[key]
+        # Shards outside the configured layout (only needed while resharding)
+        state = current_app.extensions["notes_shards"]
+        if key not in state.engines:
+            state.engines[key] = sa.create_engine(self._shard_url(index))
+        return state.engines[key]
+
+    def _shard_url(self, index):
+        url = sa.engine.make_url(current_app.config["NOTES_SHARD_URL"].format(shard=index))
+        # Match Flask-SQLAlchemy: relative SQLite paths live in the instance folder
+        if url.drivername.startswith("sqlite") and url.database not in (None, "", ":memory:") \
+                and not os.path.isabs(url.database):
+            url = url.set(database=os.path.join(current_app.instance_path, url.database))
+        return url
+
+    def route(self, user_id):
+        """Route notes statements in this app context to the user's shard."""
+        g.notes_shard = self.shard_for(user_id)
+
+    @contextmanager
+    def using(self, user_id=None, index=None):
+        """Temporarily route notes statements to a user's shard (or a shard index)."""
+        previous = g.get("notes_shard")
+        g.notes_shard = self.shard_for(user_id) if index is None else index
+        try:
+            yield g.notes_shard
+        finally:
+            g.notes_shard = previous
+
+    def each(self):
+        """
+        Yield every shard index with routing set to it, for work that spans all users.
+        - The session's identity map is cleared between shards.
+        """
+        for index in range(max(self.count, 1)):
+            self._db.session.expunge_all()
+            with self.using(index=index):
+                yield index
+
+    def scatter_gather(self, stmt):
+        """Run a read-only statement on every shard and concatenate the rows."""
+        rows = []
+        for index in range(max(self.count, 1)):
+            with self.engine(index).connect() as conn:
+                rows.extend(conn.execute(stmt).all())
+        return rows
+
+    # --- IDs ---
+
+    def next_id(self):
+        """Next globally unique note ID, or None to let the (unsharded) database assign one."""
+        if self.count <= 1:
+            return None
+        session = self._db.session()
+        note_id = next(session.info.get("note_ids", iter(())), None)
+        if note_id is not None:
+            return note_id
+        state = current_app.extensions["notes_shards"]
+        with state.lock:
+            note_id = next(state.ids, None)
+        if note_id is not None:
+            return note_id
+
+        # Reserve a new block inside the session's own transaction: on SQLite a separate
+        # connection would wait on this session's uncommitted main-database writes. The block
+        # stays private to the session until it commits (see _share_reserved_ids).
+        from .models import NoteIdAllocator
+        conn = session.connection(bind_arguments={"mapper": sa.inspect(NoteIdAllocator)})
+        ids = session.info["note_ids"] = iter(self._allocate_block(conn=conn))
+        return next(ids)
+
+    def _allocate_block(self, floor=1, conn=None):
+        """
+        Reserve the next block of IDs, starting no lower than `floor`.
+        - With `conn`, the reservation is part of that connection's transaction;
+          otherwise it is committed on its own.
+        """
+        if conn is None:
+            while True:
+                try:
+                    with self._db.engine.begin() as conn:
+                        return self._allocate_block(floor, conn)
+                except sa_exc.IntegrityError:
+                    continue  # another process initialized the allocator first
+
+        from .models import NoteIdAllocator
+        table = NoteIdAllocator.__table__
+        size = current_app.config["NOTES_ID_BLOCK_SIZE"]
+        start = sa.case((table.c.next_id < floor, floor), else_=table.c.next_id)
+        bumped = conn.execute(sa.update(table).where(table.c.id == 1).values(next_id=start + size))
+        if bumped.rowcount:
+            end = conn.scalar(sa.select(table.c.next_id).where(table.c.id == 1))
+            return range(end - size, end)
+        start = max(floor, self.max_note_id() + 1)
+        conn.execute(sa.insert(table).values(id=1, next_id=start + size))
+        return range(start, start + size)
+
+    def max_note_id(self, counts=()):
+        """Highest note ID in the default database and every shard of the given layouts."""
+        engines = {self.engine(0, 1)}
+        for count in {self.count, *counts}:
+            engines.update(self.engine(i, count) for i in range(count))
+        highest = 0
+        for engine in engines:
+            if sa.inspect(engine).has_table(NOTES_TABLE):
+                with engine.connect() as conn:
+                    highest = max(highest, conn.scalar(sa.text(f"SELECT MAX(id) FROM {NOTES_TABLE}")) or 0)
+        return highest
+
+    # --- Maintenance ---
+
+    def create_tables(self):
+        """Create the notes tables on every shard (db.create_all covers the default database)."""
+        from .models import Note, NoteChangeCounter
+        if self.count > 1:
+            for index in range(self.count):
+                NoteChangeCounter.__table__.create(self.engine(index), checkfirst=True)
+                Note.__table__.create(self.engine(index), checkfirst=True)
+
+    def drop_tables(self):
+        """Drop the notes tables on every shard (db.drop_all covers the default database)."""
+        from .models import Note, NoteChangeCounter
+        if self.count > 1:
+            for index in range(self.count):
+                Note.__table__.drop(self.engine(index), checkfirst=True)
+                NoteChangeCounter.__table__.drop(self.engine(index), checkfirst=True)
+
+    def _merge_change_counters(self, from_count):
+        """Start every new shard's change sequence past every old one, so sync tokens stay valid."""
+        from .models import NoteChangeCounter
+        table = NoteChangeCounter.__table__
+        last_seq = purged_seq = 0
+        for count in {max(from_count, 1), max(self.count, 1)}:
+            for index in range(count):
+                engine = self.engine(index, count)
+                if not sa.inspect(engine).has_table(table.name):
+                    continue
+                with engine.connect() as conn:
+                    row = conn.execute(sa.select(table.c.last_seq, table.c.purged_seq)).first()
+                if row is not None:
+                    last_seq, purged_seq = max(last_seq, row[0]), max(purged_seq, row[1])
+        for index in range(max(self.count, 1)):
+            with self.engine(index).begin() as conn:
+                conn.execute(sa.update(table).values(last_seq=last_seq, purged_seq=purged_seq))
+
+    def reshard(self, from_count, batch_size=500):
+        """
+        Move notes from a from_count-shard layout to the configured one.
+        - Copies each batch to its new shard before deleting it from the old one, so an
+          interrupted run can simply be repeated.
+        - Moved notes keep their change_seq; new shards continue past the highest old one.
+        - Returns the number of notes moved.
+        """
+        from .models import Note
+        table = Note.__table__
+        to_count = self.count
+        self.create_tables()
+        self._merge_change_counters(from_count)
+        if to_count > 1:
+            # New notes must never reuse an ID that is still in (or moving out of) an old shard
+            self._allocate_block(floor=self.max_note_id(counts=(from_count,)) + 1)
+
+        moved = 0
+        for old in range(max(from_count, 1)):
+            source = self.engine(old, from_count)
+            if not sa.inspect(source).has_table(NOTES_TABLE):
+                continue
+            last_id = 0
+            while True:
+                with source.connect() as conn:
+                    rows = conn.execute(
+                        sa.select(table).where(table.c.id > last_id).order_by(table.c.id).limit(batch_size)
+                    ).mappings().all()
+                if not rows:
+                    break
+                last_id = rows[-1]["id"]
+
+                by_target = defaultdict(list)
+                for row in rows:
+                    target = self.engine(self.shard_for(row["user_id"], to_count), to_count)
+                    if target.url != source.url:
+                        by_target[target].append(dict(row))
+
+                for target, batch in by_target.items():
+                    ids = [row["id"] for row in batch]
+                    with target.begin() as conn:
+                        conn.execute(sa.delete(table).where(table.c.id.in_(ids)))
+                        conn.execute(sa.insert(table), batch)
+                    with source.begin() as conn:
+                        conn.execute(sa.delete(table).where(table.c.id.in_(ids)))
+                    moved += len(ids)
+        return moved
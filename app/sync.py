@@ -0,0 +1,150 @@
+# app/sync.py
+# Delta sync helpers for incremental client refresh.
+# - Change tokens: opaque cursors over Note.change_seq, served by the (user_id, change_seq) index
+# - change_seq is taken from a counter bumped inside each writing transaction, so values become
+#   visible in increasing order and a token never skips a late commit
+# - Tombstone purge: hard-deletes soft-deleted notes past the retention window, in batches;
+#   tokens older than the newest purged tombstone are expired
+# - The "notes.purge_deleted" job is scheduled for when a tombstone leaves the window and
+#   reschedules itself for the oldest one still waiting
+
+import base64
+from datetime import timedelta
+from flask import current_app
+from .extensions import db, jobs, shards
+from .models import Note, NoteChangeCounter
+
+
+def encode_token(seq):
+    """Encode a change cursor (the last change_seq delivered) as an opaque, URL-safe string."""
+    return base64.urlsafe_b64encode(f"seq:{seq}".encode()).decode().rstrip("=")
+
+
+def decode_token(token):
+    """
+    Decode a change cursor into the last change_seq delivered.
+    - Raises ValueError for malformed tokens.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        prefix, _, seq = raw.partition(":")
+        if prefix != "seq":
+            raise ValueError(raw)
+        return int(seq)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid change token.") from exc
+
+
+def db_now():
+    """Current time according to the database clock (the one that stamps updated_at)."""
+    return db.session.scalar(db.select(db.func.now()))
+
+
+def retention():
+    """How long tombstones are kept for sync clients, as a timedelta."""
+    return timedelta(days=current_app.config["NOTES_TOMBSTONE_RETENTION_DAYS"])
+
+
+def tombstone_cutoff(now=None):
+    """Oldest deleted_at still covered by the retention window."""
+    return (now or db_now()) - retention()
+
+
+def change_counter():
+    """(last_seq, purged_seq) for the routed shard, as committed so far."""
+    row = db.session.execute(
+        db.select(NoteChangeCounter.last_seq, NoteChangeCounter.purged_seq)
+          .where(NoteChangeCounter.id == 1)
+    ).first()
+    return tuple(row) if row is not None else (0, 0)
+
+
+def token_expired(seq):
+    """True if a tombstone the holder of this cursor has not seen may already be purged."""
+    return seq < change_counter()[1]
+
+
+def changes_since(user_id, cursor=None, limit=100):
+    """
+    Collect a user's note changes after the given cursor (a change_seq).
+    - Returns (notes, has_more, next_token); notes include soft-deleted tombstones.
+    """
+    # Read the counter first: every change_seq up to it is committed, so the next token can
+    # move past other users' writes without skipping one of ours.
+    last_seq, _ = change_counter()
+
+    query = Note.query.filter(Note.user_id == user_id)
+    if cursor is not None:
+        query = query.filter(Note.change_seq > cursor)
+
+    rows = query.order_by(Note.change_seq).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if has_more:
+        next_seq = rows[-1].change_seq
+    else:
+        next_seq = max(last_seq, rows[-1].change_seq if rows else 0, cursor or 0)
+    return rows, has_more, encode_token(next_seq)
+
+
+def purge_deleted_notes(batch_size=500):
+    """
+    Hard-delete tombstones older than the retention window, on every shard.
+    - Works in batches so each transaction holds the write lock briefly.
+    - Records the newest purged change_seq so tokens that may have missed it get 410.
+    - Returns the number of rows removed.
+    """
+    cutoff = tombstone_cutoff()
+    purged = 0
+    for _ in shards.each():
+        while True:
+            rows = db.session.execute(
+                db.select(Note.id, Note.change_seq)
+                  .where(Note.deleted_at.is_not(None), Note.deleted_at < cutoff)
+                  .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            ids = [note_id for note_id, _ in rows]
+            newest = max(seq for _, seq in rows)
+            db.session.execute(db.delete(Note).where(Note.id.in_(ids)))
+            db.session.execute(
+                db.update(NoteChangeCounter)
+                  .where(NoteChangeCounter.id == 1)
+                  .values(purged_seq=db.case(
+                      (NoteChangeCounter.purged_seq < newest, newest),
+                      else_=NoteChangeCounter.purged_seq,
+                  ))
+            )
+            db.session.commit()
+            purged += len(ids)
+            if len(ids) < batch_size:
+                break
+    return purged
+
+
+def schedule_purge(delay=None):
+    """
+    Queue the purge job (at most one waits at a time) on the current session.
+    - delay: seconds from now; by default, when the oldest tombstone on any shard expires.
+    - Does nothing if there are no tombstones. The caller commits.
+    """
+    if delay is None:
+        oldest = [row[0] for row in shards.scatter_gather(
+            db.select(db.func.min(Note.deleted_at))) if row[0] is not None]
+        if not oldest:
+            return
+        delay = max((min(oldest) + retention() - db_now()).total_seconds(), 0)
+    # deleted_at has one-second resolution and the cutoff is exclusive
+    jobs.enqueue("notes.purge_deleted", unique=True, delay=delay + 1)
+
+
+@jobs.job("notes.purge_deleted")
+def purge_deleted_job(batch_size=500):
+    """Purge expired tombstones, then schedule the next run for the oldest one left."""
+    purged = purge_deleted_notes(batch_size=batch_size)
+    schedule_purge()
+    db.session.commit()
+    return purged
@@ -0,0 +1,82 @@
+# app/types.py
+# Custom SQLAlchemy column types.
+# - CompressedText: transparently zlib-compresses large text values at rest
+#
+# Stored format (always plain text, so no schema change is needed):
+# - "\x03" + head + "\x01" + base64(zlib(rest))  compressed; the first `prefix_length` characters
+#                                                stay plain so SQL can cut previews from them
+# - "\x01" + base64(zlib(value))                 compressed without a plain head (older rows)
+# - "\x02" + value                               escaped value that happens to start with a marker
+# - anything else                                plain value (includes rows written before compression)
+
+import base64
+import zlib
+from .extensions import db
+
+COMPRESSED = "\x01"
+ESCAPED = "\x02"
+PREFIXED = "\x03"
+MARKERS = (COMPRESSED, ESCAPED, PREFIXED)
+
+
+def _deflate(value, level):
+    return base64.b64encode(zlib.compress(value.encode(), level)).decode()
+
+
+def _inflate(packed):
+    return zlib.decompress(base64.b64decode(packed)).decode()
+
+
+def encode_text(value, threshold=1024, level=6, prefix_length=256):
+    """Encode a value in the stored format, compressing it when it is large and it pays off."""
+    if value is None:
+        return None
+    if len(value) >= threshold:
+        head, rest = value[:prefix_length], value[prefix_length:]
+        packed = PREFIXED + head + COMPRESSED + _deflate(rest, level)
+        if len(packed) < len(value):
+            return packed
+    if value.startswith(MARKERS):
+        return ESCAPED + value
+    return value
+
+
+def decode_text(stored):
+    """Decode a stored value written by encode_text (or a legacy plain value)."""
+    if not stored:
+        return stored
+    if stored[0] == PREFIXED:
+        # base64 never contains the separator, so the last one ends the head
+        head, _, packed = stored[1:].rpartition(COMPRESSED)
+        return head + _inflate(packed)
+    if stored[0] == COMPRESSED:
+        return _inflate(stored[1:])
+    if stored[0] == ESCAPED:
+        return stored[1:]
+    return stored
+
+
+class CompressedText(db.TypeDecorator):
+    """
+    Text column that compresses values of at least `threshold` characters.
+    - Reads both compressed and plain rows, so it can replace db.Text in place.
+    - The first `prefix_length` characters of a compressed value stay plain, so SUBSTR
+      previews up to that length work on every row; see Note.preview_expr.
+    """
+
+    impl = db.Text
+    cache_ok = True
+
+    def __init__(self, threshold=1024, level=6, prefix_length=256, **kwargs):
+        super().__init__(**kwargs)
+        if prefix_length >= threshold:
+            raise ValueError("prefix_length must be smaller than threshold.")
+        self.threshold = threshold
+        self.level = level
+        self.prefix_length = prefix_length
+
+    def process_bind_param(self, value, dialect):
+        return encode_text(value, self.threshold, self.level, self.prefix_length)
+
+    def process_result_value(self, value, dialect):
+        return decode_text(value)
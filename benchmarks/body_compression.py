@@ -0,0 +1,82 @@
+# benchmarks/body_compression.py
+# Benchmark: note body compression at rest (CompressedText vs plain Text).
+# - Writes the same notes into two SQLite files and compares file size
+# - Times bulk inserts and full-table reads for each
+#
+# Usage: python benchmarks/body_compression.py [--rows 2000] [--words 2000] [--level 6]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import sqlalchemy as sa
+from app.types import CompressedText
+
+VOCAB = (
+    "meeting project deadline review draft budget client design sprint release "
+    "notes action item follow up agenda summary feedback roadmap estimate risk"
+).split()
+
+
+def make_bodies(rows, words, seed=42):
+    rng = random.Random(seed)
+    bodies = []
+    for i in range(rows):
+        # Mostly short notes, with a few users pasting huge documents
+        n = words * 10 if i % 20 == 0 else rng.randint(5, words)
+        bodies.append(" ".join(rng.choice(VOCAB) for _ in range(n)))
+    return bodies
+
+
+def run(body_type, bodies, path):
+    engine = sa.create_engine(f"sqlite:///{path}")
+    meta = sa.MetaData()
+    notes = sa.Table(
+        "notes", meta,
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("body", body_type),
+    )
+    meta.create_all(engine)
+
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(notes.insert(), [{"body": b} for b in bodies])
+    write = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        rows = conn.execute(sa.select(notes.c.body)).scalars().all()
+    read = time.perf_counter() - start
+    assert rows == bodies
+
+    with engine.connect() as conn:
+        conn.exec_driver_sql("VACUUM")
+    engine.dispose()
+    return os.path.getsize(path), write, read
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=2000)
+    parser.add_argument("--level", type=int, default=6, help="zlib level for CompressedText")
+    args = parser.parse_args()
+
+    bodies = make_bodies(args.rows, args.words)
+    raw_mb = sum(len(b) for b in bodies) / 1e6
+    print(f"{args.rows} notes, {raw_mb:.1f} MB of body text")
+    print(f"{'type':<16}{'db size (MB)':>14}{'write (s)':>12}{'read (s)':>12}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, body_type in (("Text", sa.Text()), ("CompressedText", CompressedText(level=args.level))):
+            size, write, read = run(body_type, bodies, os.path.join(tmp, f"{name}.db"))
+            print(f"{name:<16}{size / 1e6:>14.2f}{write:>12.3f}{read:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/sharded_writes.py
+# Benchmark: note write throughput vs. number of shards.
+# - N concurrent users (threads) each create notes, one commit per note
+# - Repeated for each shard count; every run uses fresh SQLite files
+#
+# Usage: python benchmarks/sharded_writes.py [--users 8] [--notes 100] [--shards 1 2 4 8]
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import create_app
+from app.extensions import db, shards
+from app.models import Note, User
+
+
+def run(tmp, count, users, notes):
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp}/main_{count}.db",
+        "NOTES_SHARDS": count,
+        "NOTES_SHARD_URL": f"sqlite:///{tmp}/s{count}_notes_{{shard}}.db",
+        "SQLALCHEMY_ENGINE_OPTIONS": {"connect_args": {"timeout": 60}},
+        "JOBS_WORKERS": 0,
+    })
+    with app.app_context():
+        db.create_all()
+        shards.create_tables()
+        # Spread users evenly so the run measures scaling, not hash luck
+        user_ids, candidate = [], 1
+        while len(user_ids) < users:
+            if shards.shard_for(candidate) == len(user_ids) % count:
+                user_ids.append(candidate)
+            candidate += 1
+        db.session.add_all(User(id=i, email=f"u{i}@example.com", password_hash="x") for i in user_ids)
+        db.session.commit()
+
+    def writer(user_id):
+        with app.app_context(), shards.using(user_id):
+            for i in range(notes):
+                db.session.add(Note(user_id=user_id, title=f"note {i}", body="body " * 50))
+                db.session.commit()
+            db.session.remove()
+
+    threads = [threading.Thread(target=writer, args=(user_id,)) for user_id in user_ids]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return users * notes / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--notes", type=int, default=100)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    print(f"{args.users} concurrent users x {args.notes} notes, one commit per note")
+    print(f"{'shards':>6}{'writes/s':>12}{'speedup':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = None
+        for count in args.shards:
+            rate = run(tmp, count, args.users, args.notes)
+            baseline = baseline or rate
+            print(f"{count:>6}{rate:>12.0f}{rate / baseline:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
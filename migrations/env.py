@@ -7,6 +7,8 @@ from flask import current_app
 
 from alembic import context
 
+from app.types import CompressedText
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -32,6 +34,17 @@ target_db = current_app.extensions['migrate'].db
 # ... etc.
 
 
+def render_item(type_, obj, autogen_context):
+    """Render the app's custom column types as their plain storage type.
+
+    CompressedText only changes values in Python; the column itself is TEXT,
+    and generated scripts must not import the app.
+    """
+    if type_ == "type" and isinstance(obj, CompressedText):
+        return "sa.Text()"
+    return False
+
+
 def get_metadata():
     if hasattr(target_db, 'metadatas'):
         return target_db.metadatas[None]
@@ -52,7 +65,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        render_item=render_item
     )
 
     with context.begin_transaction():
@@ -84,6 +98,7 @@ def run_migrations_online():
             connection=connection,
             target_metadata=get_metadata(),
             process_revision_directives=process_revision_directives,
+            render_item=render_item,
             **current_app.extensions['migrate'].configure_args
         )
 
@@ -1,29 +1,32 @@
 # seed.py
 # Database seeding script.
-# - Drops and recreates tables
+# - Drops and recreates tables (including the notes tables on every shard)
 # - Adds demo user (demo@example.com / password123)
 # - Adds sample notes for testing
 
 from faker import Faker
 from app import create_app
-from app.extensions import db
+from app.extensions import db, shards
 from app.models import User, Note
 
 fake = Faker()
 app = create_app()
 
 with app.app_context():
+    shards.drop_tables()
     db.drop_all()
     db.create_all()
+    shards.create_tables()
 
     user = User(email="demo@example.com")
     user.set_password("password123")
     db.session.add(user)
     db.session.flush()
 
-    for _ in range(5):
-        note = Note(user_id=user.id, title=fake.sentence(), body=fake.paragraph())
-        db.session.add(note)
+    with shards.using(user.id):
+        for _ in range(5):
+            note = Note(user_id=user.id, title=fake.sentence(), body=fake.paragraph())
+            db.session.add(note)
 
-    db.session.commit()
+        db.session.commit()
     print("Seeded demo user demo@example.com / password123 and 5 notes")
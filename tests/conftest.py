@@ -1,6 +1,7 @@
 # tests/conftest.py
 # Pytest configuration and fixtures.
-# - Provides app fixture (with in-memory SQLite DB)
+# - Provides app fixture (with in-memory SQLite DB and a per-test job queue)
+# - Provides file_app fixture (file-backed SQLite DB) for tests that make requests from several threads
 # - Provides test client and sample user fixtures
 
 import pytest
@@ -16,14 +17,15 @@ from app import create_app
 from app.extensions import db
 from app.models import User
 
-@pytest.fixture
-def app():
-    app = create_app()
-    app.config.update({
+def make_app(tmp_path, database_uri):
+    # Config goes through create_app: Flask-SQLAlchemy builds its engines during init_app
+    app = create_app({
         "TESTING": True,
-        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "SQLALCHEMY_DATABASE_URI": database_uri,
         "SECRET_KEY": "test-secret",
         "WTF_CSRF_ENABLED": False,
+        "JOBS_DATABASE": str(tmp_path / "jobs.db"),
+        "JOBS_WORKERS": 0,
     })
 
     with app.app_context():
@@ -32,6 +34,15 @@ def app():
         db.session.remove()
         db.drop_all()
 
+@pytest.fixture
+def app(tmp_path):
+    yield from make_app(tmp_path, "sqlite:///:memory:")
+
+@pytest.fixture
+def file_app(tmp_path):
+    """Like app, but backed by a SQLite file so requests on other threads get their own connections."""
+    yield from make_app(tmp_path, f"sqlite:///{tmp_path / 'app.db'}")
+
 @pytest.fixture
 def client(app):
     return app.test_client()
@@ -0,0 +1,134 @@
+# tests/test_admission.py
+# Tests admission control and load shedding.
+# - AIMD: the limit shrinks on slow requests and grows while saturated and fast
+# - Saturated pools shed with a fast 503 + Retry-After; the health check bypasses them
+# - A login flood is shed in the auth pool without hurting GET /notes latency
+
+import math
+import threading
+import time
+from app import create_app
+from app.admission import AdaptiveLimiter
+from app.extensions import db
+from app.models import User
+
+
+def make_limiter(**options):
+    defaults = {"limit": 2, "min_limit": 1, "max_limit": 4, "max_queue": 1,
+                "timeout": 0.05, "target_latency": 0.1}
+    return AdaptiveLimiter("test", **{**defaults, **options})
+
+
+def test_limiter_sheds_when_full():
+    """Beyond the limit one caller may queue; the rest are shed immediately."""
+    limiter = make_limiter()
+    assert limiter.acquire() and limiter.acquire()
+
+    started = time.monotonic()
+    assert limiter.acquire() is False  # queued, then timed out
+    assert time.monotonic() - started < 0.5
+    assert limiter.stats()["shed"] == 1
+
+
+def test_limiter_aimd():
+    """Slow requests cut the limit multiplicatively; saturated fast ones grow it additively."""
+    limiter = make_limiter(limit=4, decrease=0.5)
+    limiter.acquire()
+    limiter.release(latency=1.0)
+    assert limiter.limit == 2.0
+
+    limiter.acquire()
+    limiter.acquire()
+    limiter.release(latency=0.01)  # both slots were in use
+    assert limiter.limit == 2.5
+    limiter.release(latency=0.01)  # no longer saturated
+    assert limiter.limit == 2.5
+    assert limiter.inflight == 0
+
+
+def test_saturated_pool_returns_503_but_health_passes(app, client):
+    """With every slot taken, /notes is shed quickly and / still answers."""
+    limiters = app.extensions["admission"].limiters
+    for limiter in limiters.values():
+        limiter.max_queue = 0
+        while limiter.acquire():
+            pass
+        limiter.shed = 0
+
+    resp = client.get("/notes")
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "1"
+    assert client.get("/").status_code == 200
+    assert limiters["notes"].stats()["shed"] == 1
+
+
+def test_pools_from_environment(tmp_path, monkeypatch):
+    """ADMISSION_POOLS can be set as JSON in the environment, so deployments can tune pools."""
+    monkeypatch.setenv("ADMISSION_POOLS", '{"auth": {"limit": 3}, "reports": {"max_queue": 5}}')
+    app = create_app({"JOBS_DATABASE": str(tmp_path / "jobs.db")})
+    limiters = app.extensions["admission"].limiters
+    assert limiters["auth"].limit == 3
+    assert limiters["reports"].max_queue == 5
+
+
+def test_disabled(tmp_path):
+    """ADMISSION_ENABLED=False leaves wsgi_app unwrapped."""
+    app = create_app({"ADMISSION_ENABLED": False, "JOBS_DATABASE": str(tmp_path / "jobs.db")})
+    assert "admission" not in app.extensions
+
+
+def test_login_flood_does_not_starve_notes(tmp_path, monkeypatch):
+    """A flood of slow logins is shed in the auth pool while GET /notes stays fast."""
+    app = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'app.db'}",
+        "JOBS_DATABASE": str(tmp_path / "jobs.db"),
+        "JOBS_WORKERS": 0,
+        "ADMISSION_POOLS": {"auth": {"limit": 2, "max_limit": 2, "max_queue": 2, "timeout": 0.2}},
+    })
+    with app.app_context():
+        db.create_all()
+        user = User(email="flood@example.com")
+        user.set_password("pw")
+        db.session.add(user)
+        db.session.commit()
+
+    notes_client = app.test_client()
+    notes_client.post("/login", json={"username": "flood@example.com", "password": "pw"})
+
+    slow_check = User.check_password
+
+    def check_password(self, password):
+        time.sleep(0.1)  # stand-in for an expensive hash
+        return slow_check(self, password)
+
+    monkeypatch.setattr(User, "check_password", check_password)
+
+    stop = threading.Event()
+    auth_statuses = []
+
+    def flood():
+        client = app.test_client()
+        while not stop.is_set():
+            resp = client.post("/login", json={"username": "flood@example.com", "password": "pw"})
+            auth_statuses.append(resp.status_code)
+
+    threads = [threading.Thread(target=flood) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+
+    samples = 200
+    latencies, statuses = [], []
+    for _ in range(samples):
+        started = time.monotonic()
+        statuses.append(notes_client.get("/notes").status_code)
+        latencies.append(time.monotonic() - started)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    assert statuses == [200] * samples
+    assert latencies[math.ceil(0.99 * samples) - 1] < 0.5  # p99
+    assert 503 in auth_statuses and 200 in auth_statuses
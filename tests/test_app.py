@@ -1,7 +1,19 @@
 # tests/test_app.py
-# Tests the root app setup and health check endpoint.
+# Tests the root app setup, health check, and operator stats endpoints.
 
 def test_health_endpoint(client):
     resp = client.get("/")
     assert resp.status_code == 200
     assert resp.json["status"] == "ok"
+
+
+def test_stats_endpoint(app, client):
+    """GET /stats needs the STATS_TOKEN bearer token and reports cache and admission counters."""
+    assert client.get("/stats").status_code == 404  # disabled without a token
+
+    app.config["STATS_TOKEN"] = "s3cret"
+    assert client.get("/stats", headers={"Authorization": "Bearer wrong"}).status_code == 404
+    resp = client.get("/stats", headers={"Authorization": "Bearer s3cret"})
+    assert resp.status_code == 200
+    assert resp.json["response_cache"]["misses"] == 0
+    assert set(resp.json["admission"]) == {"auth", "notes", "default"}
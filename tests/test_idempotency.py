@@ -0,0 +1,153 @@
+# tests/test_idempotency.py
+# Tests Idempotency-Key handling on POST /notes and POST /signup.
+# - Replays return the first response without re-running the handler
+# - Keys are scoped per user and bound to the original payload
+# - Concurrent duplicates wait on the in-flight request
+# - A staged response commits together with the handler's writes
+# - Expired keys are evicted in batches
+
+import threading
+import time
+from datetime import timedelta
+from flask import g
+from app.extensions import db
+from app.idempotency import idempotent, purge_expired_keys, stage_response
+from app.models import IdempotencyKey, Note
+
+
+def signup(client, username, key=None):
+    headers = {"Idempotency-Key": key} if key else {}
+    return client.post("/signup", headers=headers, json={
+        "username": username,
+        "password": "pw",
+        "password_confirmation": "pw"
+    })
+
+
+def test_create_note_replay_does_not_duplicate(client):
+    """Retrying POST /notes with the same key returns the first note."""
+    signup(client, "idemuser")
+    headers = {"Idempotency-Key": "note-1"}
+    first = client.post("/notes", headers=headers, json={"title": "Once"})
+    second = client.post("/notes", headers=headers, json={"title": "Once"})
+
+    assert first.status_code == second.status_code == 201
+    assert second.json == first.json
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert client.get("/notes").json["meta"]["total"] == 1
+
+
+def test_key_reused_with_different_payload(client):
+    """A key reused for a different request body is rejected with 422."""
+    signup(client, "idemmismatch")
+    headers = {"Idempotency-Key": "note-2"}
+    client.post("/notes", headers=headers, json={"title": "A"})
+    resp = client.post("/notes", headers=headers, json={"title": "B"})
+    assert resp.status_code == 422
+
+
+def test_keys_are_scoped_per_user(client):
+    """The same key from two users creates two notes."""
+    signup(client, "scope1")
+    client.post("/notes", headers={"Idempotency-Key": "shared"}, json={"title": "Same"})
+    client.delete("/logout")
+    signup(client, "scope2")
+    resp = client.post("/notes", headers={"Idempotency-Key": "shared"}, json={"title": "Same"})
+    assert "Idempotent-Replayed" not in resp.headers
+    assert client.get("/notes").json["meta"]["total"] == 1
+
+
+def test_signup_replay_skips_hashing_and_restores_session(app, monkeypatch):
+    """A retried signup replays the 201 and logs the new client in without re-hashing."""
+    first = app.test_client()
+    assert signup(first, "retrier", key="signup-1").status_code == 201
+
+    from app.models import User
+    def fail(*args):
+        raise AssertionError("password hashed twice")
+    monkeypatch.setattr(User, "set_password", fail)
+
+    g.pop("_login_user", None)  # the fixture's app context outlives requests; drop the cached login
+    retry = app.test_client()  # the client that timed out never got the cookie
+    resp = signup(retry, "retrier", key="signup-1")
+    assert resp.status_code == 201
+    assert resp.headers["Idempotent-Replayed"] == "true"
+    assert retry.get("/check_session").json["username"] == "retrier"
+
+
+def test_concurrent_duplicates_wait_for_in_flight(file_app):
+    """A duplicate arriving mid-request waits and replays instead of running twice."""
+    app = file_app
+    calls = []
+
+    @app.post("/slow")
+    @idempotent()
+    def slow():
+        calls.append(1)
+        time.sleep(0.3)
+        return {"call": len(calls)}, 201
+
+    results = []
+    def post():
+        resp = app.test_client().post("/slow", headers={"Idempotency-Key": "slow-1"}, json={})
+        results.append((resp.status_code, resp.json))
+
+    threads = [threading.Thread(target=post) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [(201, {"call": 1})] * 3
+
+
+def test_staged_response_commits_with_handler(app):
+    """A response staged before the view's commit is stored by that commit, not after the view."""
+    stored = []
+
+    @app.post("/staged")
+    @idempotent()
+    def staged():
+        rv = stage_response(({"ok": True}, 201))
+        db.session.commit()
+        stored.append(db.session.scalar(db.select(IdempotencyKey.status).filter_by(key="s")))
+        return rv
+
+    client = app.test_client()
+    assert client.post("/staged", headers={"Idempotency-Key": "s"}).status_code == 201
+    assert stored == [201]
+    replay = client.post("/staged", headers={"Idempotency-Key": "s"})
+    assert (replay.json, replay.headers["Idempotent-Replayed"]) == ({"ok": True}, "true")
+    assert len(stored) == 1
+
+
+def test_server_error_releases_key(app):
+    """A 5xx response is not stored, so the client can retry."""
+    outcomes = iter([({"error": "down"}, 503), ({"ok": True}, 201)])
+
+    @app.post("/flaky")
+    @idempotent()
+    def flaky():
+        return next(outcomes)
+
+    client = app.test_client()
+    assert client.post("/flaky", headers={"Idempotency-Key": "f"}).status_code == 503
+    assert client.post("/flaky", headers={"Idempotency-Key": "f"}).status_code == 201
+
+
+def test_purge_expired_keys(client):
+    """Only keys past the TTL are evicted, in batches."""
+    signup(client, "purger")
+    for i in range(5):
+        client.post("/notes", headers={"Idempotency-Key": f"k{i}"}, json={"title": f"N{i}"})
+    old = db.session.scalar(db.select(db.func.now())) - timedelta(days=2)
+    db.session.execute(
+        db.update(IdempotencyKey).where(IdempotencyKey.key.in_(["k0", "k1", "k2"])).values(created_at=old)
+    )
+    db.session.commit()
+
+    assert purge_expired_keys(batch_size=2) == 3
+    assert sorted(db.session.scalars(db.select(IdempotencyKey.key))) == ["k3", "k4"]
+    assert Note.query.count() == 5
@@ -0,0 +1,160 @@
+# tests/test_jobs.py
+# Tests the background job subsystem.
+# - Jobs persist only after commit (never for rolled-back transactions)
+# - Retries with backoff, then parked as failed
+# - Crash recovery: expired leases and reopening the durable queue
+# - In-process worker threads and the delayed, self-rescheduling tombstone purge job
+
+import time
+from datetime import timedelta
+import pytest
+from app.extensions import db, jobs
+from app.jobs import SQLiteJobStore
+from app.models import Note
+
+calls = []
+
+
+@pytest.fixture
+def app(file_app):
+    # Worker threads run jobs in their own app context, so use a file-backed database
+    return file_app
+
+
+@jobs.job("test.record")
+def record(value):
+    calls.append(value)
+
+@jobs.job("test.explode")
+def explode():
+    raise RuntimeError("boom")
+
+
+def store(app):
+    return jobs.state(app).store
+
+
+def test_job_runs_only_after_commit(app):
+    """Enqueued jobs are persisted on commit and dropped on rollback."""
+    calls.clear()
+    jobs.enqueue("test.record", value="rolled back")
+    db.session.rollback()
+    assert store(app).counts() == {}
+
+    jobs.enqueue("test.record", value="committed")
+    db.session.commit()
+    assert store(app).counts() == {"pending": 1}
+
+    assert jobs.run_pending(app) == 1
+    assert calls == ["committed"]
+    assert store(app).counts() == {}
+
+
+def test_unique_jobs_are_deduplicated(app):
+    """unique=True skips a job already pending under the same name."""
+    for _ in range(3):
+        jobs.enqueue("test.record", unique=True, value=1)
+        db.session.commit()
+    assert store(app).counts() == {"pending": 1}
+
+
+def test_unique_job_queued_while_one_runs(app):
+    """A running job does not absorb a unique enqueue, so work committed meanwhile gets a run."""
+    jobs.enqueue("test.record", unique=True, value=1)
+    db.session.commit()
+    assert store(app).claim(lease_seconds=60) is not None
+
+    jobs.enqueue("test.record", unique=True, value=2)
+    db.session.commit()
+    assert store(app).counts() == {"running": 1, "pending": 1}
+
+
+def test_failed_job_retries_with_backoff(app):
+    """A failing job is retried after a backoff delay, then parked as failed."""
+    app.config.update({"JOBS_MAX_ATTEMPTS": 3, "JOBS_BACKOFF_SECONDS": 0.05})
+    jobs.enqueue("test.explode")
+    db.session.commit()
+
+    assert jobs.run_one(app) is True      # attempt 1 fails, retry in 0.05s
+    assert jobs.run_one(app) is False     # not due yet
+    time.sleep(0.06)
+    assert jobs.run_one(app) is True      # attempt 2 fails, retry in 0.1s
+    time.sleep(0.11)
+    assert jobs.run_one(app) is True      # attempt 3 fails for good
+    time.sleep(0.25)
+    assert jobs.run_one(app) is False
+    assert store(app).counts() == {"failed": 1}
+
+
+def test_crashed_worker_lease_expires(app):
+    """A job claimed by a worker that died is picked up once its lease expires."""
+    calls.clear()
+    jobs.enqueue("test.record", value="recovered")
+    db.session.commit()
+
+    # Simulate a worker that claimed the job and crashed before finishing
+    assert store(app).claim(lease_seconds=0.1) is not None
+    assert jobs.run_one(app) is False
+    time.sleep(0.11)
+
+    assert jobs.run_one(app) is True
+    assert calls == ["recovered"]
+
+
+def test_queue_survives_restart(app):
+    """Pending jobs are durable: a fresh store on the same file sees them."""
+    jobs.enqueue("test.record", value="durable")
+    db.session.commit()
+
+    reopened = SQLiteJobStore(app.config["JOBS_DATABASE"])
+    job_id, name, payload, attempts = reopened.claim(lease_seconds=60)
+    assert (name, payload, attempts) == ("test.record", {"value": "durable"}, 1)
+
+
+def test_in_process_workers_drain_queue(app):
+    """Worker threads pick up jobs as soon as they are committed."""
+    calls.clear()
+    app.config["JOBS_WORKERS"] = 2
+    try:
+        for i in range(5):
+            jobs.enqueue("test.record", value=i)
+        db.session.commit()
+        deadline = time.time() + 5
+        while len(calls) < 5 and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        jobs.shutdown(app)
+    assert sorted(calls) == [0, 1, 2, 3, 4]
+
+
+def test_delete_note_schedules_purge(client):
+    """Deleting a note schedules the purge for when its tombstone leaves the retention window."""
+    app = client.application
+    client.post("/signup", json={
+        "username": "jobuser",
+        "password": "pw",
+        "password_confirmation": "pw"
+    })
+    first, second = (client.post("/notes", json={"title": t}).json["id"] for t in ("A", "B"))
+    client.delete(f"/notes/{first}")
+    client.delete(f"/notes/{second}")
+
+    retention = app.config["NOTES_TOMBSTONE_RETENTION_DAYS"] * 86400
+    assert store(app).counts() == {"pending": 1}
+    run_at = store(app)._connect().execute("SELECT run_at FROM jobs").fetchone()[0]
+    assert run_at == pytest.approx(time.time() + retention, abs=60)
+    assert jobs.run_pending(app) == 0  # not due yet
+
+    # The first tombstone expires; the job purges it and reschedules for the second one
+    old = db.session.scalar(db.select(db.func.now())) - timedelta(seconds=retention + 60)
+    db.session.execute(db.update(Note).where(Note.id == first).values(deleted_at=old))
+    db.session.commit()
+    store(app)._connect().execute("UPDATE jobs SET run_at = 0")
+    assert jobs.run_pending(app) == 1
+
+    db.session.expire_all()
+    assert db.session.get(Note, first) is None
+    assert db.session.get(Note, second) is not None
+    assert store(app).counts() == {"pending": 1}
+    run_at = store(app)._connect().execute("SELECT run_at FROM jobs").fetchone()[0]
+    assert run_at == pytest.approx(time.time() + retention, abs=60)
@@ -2,10 +2,13 @@
 # Tests model functionality.
 # - User model: password hashing, verification, email field
 # - Note model: created_at and updated_at timestamps auto-population & update behavior
+# - Note body compression at rest (CompressedText) and the batched migration
 
 from app.models import User, Note
 from app.extensions import db
 import time
+import base64
+import zlib
 
 def test_password_hashing(user):
     """User password hashing and verification works."""
@@ -16,6 +19,94 @@ def test_user_email(user):
     """User email is stored correctly."""
     assert user.email == "test@example.com"
 
+def test_note_body_compressed_at_rest(client, user):
+    """Large bodies are stored compressed but read back unchanged; small ones stay plain."""
+    big = "lorem ipsum dolor sit amet " * 200
+    small = "\x01 looks like a marker"
+    notes = [Note(user_id=user.id, title="Big", body=big), Note(user_id=user.id, title="Small", body=small)]
+    db.session.add_all(notes)
+    db.session.commit()
+    db.session.expire_all()
+
+    stored = dict(db.session.execute(
+        db.select(Note.title, db.type_coerce(Note.body, db.Text))
+    ).all())
+    assert stored["Big"].startswith("\x03" + big[:256]) and len(stored["Big"]) < len(big) // 4
+    assert stored["Small"] == "\x02" + small
+
+    assert db.session.get(Note, notes[0].id).body == big
+    assert db.session.get(Note, notes[1].id).body == small
+
+def test_note_body_reads_legacy_plain_rows(client, user):
+    """Rows written before compression (plain text) still read correctly."""
+    note = Note(user_id=user.id, title="Legacy")
+    db.session.add(note)
+    db.session.commit()
+    legacy = "plain old text " * 200
+    db.session.execute(
+        db.update(Note).where(Note.id == note.id)
+          .values(body=db.type_coerce(db.literal(legacy), db.Text))
+    )
+    db.session.commit()
+    db.session.expire_all()
+
+    assert db.session.get(Note, note.id).body == legacy
+
+def test_note_preview_expr_handles_compressed_rows(client, user):
+    """Note.preview_expr truncates both plain and compressed bodies."""
+    db.session.add_all([
+        Note(user_id=user.id, title="Big", body="abcdefghij" * 500),
+        Note(user_id=user.id, title="Plain", body="short body"),
+    ])
+    db.session.commit()
+
+    previews = db.session.execute(
+        db.select(Note.title, Note.preview_expr(5)).order_by(Note.id)
+    ).all()
+    assert [(t, p[:5]) for t, p in previews] == [("Big", "abcde"), ("Plain", "short")]
+
+def test_note_preview_of_compressed_row_is_cut_in_sql(client, user):
+    """A short preview of a compressed body fetches only the preview, not the stored blob."""
+    big = "".join(f"word{i} " for i in range(20000))
+    note = Note(user_id=user.id, title="Huge", body=big)
+    db.session.add(note)
+    db.session.commit()
+
+    fetched = db.session.scalar(db.select(db.func.length(Note.preview_expr(5))))
+    stored = db.session.scalar(db.select(db.func.length(db.type_coerce(Note.body, db.Text))))
+    assert fetched == 1 + 5  # escape marker + preview
+    assert stored > 10_000
+    assert db.session.scalar(db.select(Note.preview_expr(5))) == big[:5]
+    # Previews longer than the plain head still come back correct (decoded in Python)
+    assert db.session.scalar(db.select(Note.preview_expr(1000)))[:1000] == big[:1000]
+
+def test_compress_note_bodies_migrates_plain_rows(client, user):
+    """compress_note_bodies rewrites large plain and old-format rows in batches without touching updated_at."""
+    from app.commands import compress_note_bodies
+
+    notes = [Note(user_id=user.id, title=f"N{i}") for i in range(4)]
+    db.session.add_all(notes)
+    db.session.commit()
+    legacy = "plain old text " * 200
+    old_format = "\x01" + base64.b64encode(zlib.compress(legacy.encode())).decode()
+    for note, raw in zip(notes, [legacy, legacy, old_format]):
+        db.session.execute(
+            db.update(Note).where(Note.id == note.id)
+              .values(body=db.type_coerce(db.literal(raw), db.Text))
+        )
+    db.session.commit()
+    before = {n.id: (n.updated_at, n.change_seq) for n in Note.query.all()}
+    assert db.session.scalar(db.select(Note.preview_expr(5)).where(Note.id == notes[2].id)) == legacy
+
+    assert compress_note_bodies(batch_size=2) == (4, 3)
+    assert compress_note_bodies(batch_size=2) == (4, 0)  # idempotent
+
+    raw = db.session.scalars(db.select(db.type_coerce(Note.body, db.Text)).order_by(Note.id)).all()
+    assert all(r.startswith("\x03") for r in raw[:3])
+    db.session.expire_all()
+    assert all(n.body == legacy for n in Note.query.all()[:3])
+    assert {n.id: (n.updated_at, n.change_seq) for n in Note.query.all()} == before
+
 def test_note_timestamps(client, user):
     """Notes automatically set created_at and updated_at."""
     note = Note(user_id=user.id, title="Timestamp test", body="Body")
@@ -3,6 +3,7 @@
 # - Create and list notes
 # - Enforce login for notes endpoints
 # - Pagination of notes
+# - Field projection (?fields=) and body previews (?preview=)
 # - Handle invalid/missing notes (404s)
 
 def signup_and_login(client, username="noteuser", password="pw"):
@@ -166,3 +167,44 @@ def test_delete_note_not_found(client):
     resp = client.delete("/notes/9999")
     assert resp.status_code == 404
     assert "error" in resp.json
+
+def test_list_notes_field_projection(app, client):
+    """?fields= limits the payload and never selects the body column."""
+    from sqlalchemy import event
+    from app.extensions import db
+
+    signup_and_login(client, "projector")
+    client.post("/notes", json={"title": "Long", "body": "x" * 5000})
+
+    statements = []
+    def capture(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        resp = client.get("/notes?fields=id,title,updated_at")
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+
+    assert resp.status_code == 200
+    assert set(resp.json["data"][0]) == {"id", "title", "updated_at"}
+    page_queries = [s for s in statements if "notes.title" in s and "count(" not in s]
+    assert page_queries
+    assert not any("notes.body" in s for s in page_queries)
+
+def test_list_notes_preview(client):
+    """?preview=N adds a body preview truncated to N characters."""
+    signup_and_login(client, "previewer")
+    client.post("/notes", json={"title": "Long", "body": "abcdefghij" * 100})
+    client.post("/notes", json={"title": "Empty"})
+
+    resp = client.get("/notes?fields=id,title&preview=5")
+    assert resp.status_code == 200
+    assert [n["preview"] for n in resp.json["data"]] == ["abcde", ""]
+    assert "body" not in resp.json["data"][0]
+
+def test_list_notes_invalid_projection(client):
+    """Unknown fields or a bad preview length return 400."""
+    signup_and_login(client, "badfields")
+    assert client.get("/notes?fields=id,secret").status_code == 400
+    assert client.get("/notes?fields=,").status_code == 400
+    assert client.get("/notes?preview=0").status_code == 400
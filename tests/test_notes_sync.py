@@ -0,0 +1,168 @@
+# tests/test_notes_sync.py
+# Tests the notes delta sync endpoint.
+# - Full and incremental sync via change tokens
+# - A write that commits after a poll is still delivered by the next one
+# - A missing change counter row is recreated past the stored change_seqs
+# - Tombstones for deleted notes
+# - Invalid / expired tokens
+# - Batched purge of old tombstones
+
+from datetime import timedelta
+from flask import g
+from app.extensions import db
+from app.models import Note, NoteChangeCounter, next_change_seq
+from app.sync import change_counter, purge_deleted_notes
+
+
+def signup(client, username="syncuser"):
+    """Helper: sign up (and implicitly log in) a test user."""
+    client.post("/signup", json={
+        "username": username,
+        "password": "pw",
+        "password_confirmation": "pw"
+    })
+    return client
+
+
+def test_changes_full_then_incremental(client):
+    """A full sync returns every note; the next token only returns later changes."""
+    signup(client)
+    first = client.post("/notes", json={"title": "First"}).json["id"]
+    second = client.post("/notes", json={"title": "Second"}).json["id"]
+
+    resp = client.get("/notes/changes")
+    assert resp.status_code == 200
+    assert {n["id"] for n in resp.json["data"]} == {first, second}
+    assert resp.json["deleted"] == []
+    assert resp.json["meta"]["has_more"] is False
+    token = resp.json["meta"]["next"]
+
+    client.put(f"/notes/{second}", json={"title": "Second (edited)"})
+    client.delete(f"/notes/{first}")
+
+    resp = client.get(f"/notes/changes?since={token}")
+    assert resp.status_code == 200
+    assert [n["title"] for n in resp.json["data"]] == ["Second (edited)"]
+    assert resp.json["deleted"] == [first]
+
+
+def test_changes_pages_with_limit(client):
+    """has_more and the next token walk through changes in batches."""
+    signup(client)
+    for i in range(5):
+        client.post("/notes", json={"title": f"Note {i}"})
+
+    seen = []
+    token = None
+    while True:
+        url = "/notes/changes?limit=2" + (f"&since={token}" if token else "")
+        resp = client.get(url)
+        seen.extend(n["id"] for n in resp.json["data"])
+        token = resp.json["meta"]["next"]
+        if not resp.json["meta"]["has_more"]:
+            break
+    assert len(seen) == 5
+    assert len(set(seen)) == 5
+
+
+def test_late_commit_is_not_skipped(file_app):
+    """A change_seq taken before a poll but committed after it arrives on the next poll."""
+    client = file_app.test_client()
+    user_id = signup(client).get("/check_session").json["id"]
+    client.post("/notes", json={"title": "Early"})
+    token = client.get("/notes/changes").json["meta"]["next"]
+
+    with db.engine.connect() as conn:
+        trans = conn.begin()
+        seq = next_change_seq(conn)
+        conn.execute(db.insert(Note).values(user_id=user_id, title="Late", change_seq=seq))
+
+        resp = client.get(f"/notes/changes?since={token}")
+        assert resp.json["data"] == []
+        token = resp.json["meta"]["next"]
+        trans.commit()
+
+    resp = client.get(f"/notes/changes?since={token}")
+    assert [n["title"] for n in resp.json["data"]] == ["Late"]
+
+
+def test_unmodified_note_keeps_change_seq(app, client):
+    """Flushing a note with no changes does not report it as changed."""
+    signup(client)
+    note_id = client.post("/notes", json={"title": "Same"}).json["id"]
+    note = db.session.get(Note, note_id)
+    seq = note.change_seq
+
+    note.title = "Same"
+    db.session.commit()
+    assert db.session.get(Note, note_id).change_seq == seq
+
+
+def test_missing_change_counter_is_recreated(app, client):
+    """A database without the counter row (e.g. migrated by hand) still accepts writes."""
+    signup(client)
+    first = client.post("/notes", json={"title": "Before"}).json["id"]
+    db.session.execute(db.delete(NoteChangeCounter))
+    db.session.commit()
+
+    resp = client.post("/notes", json={"title": "After"})
+    assert resp.status_code == 201
+    seqs = [db.session.get(Note, note_id).change_seq for note_id in (first, resp.json["id"])]
+    assert seqs[1] == seqs[0] + 1
+    assert change_counter() == (seqs[1], 0)
+
+
+def test_deleted_note_hidden_from_reads(client):
+    """Soft-deleted notes are gone from list, get, update, and delete."""
+    signup(client)
+    note_id = client.post("/notes", json={"title": "Gone"}).json["id"]
+    client.delete(f"/notes/{note_id}")
+
+    assert client.get("/notes").json["meta"]["total"] == 0
+    assert client.get(f"/notes/{note_id}").status_code == 404
+    assert client.put(f"/notes/{note_id}", json={"title": "x"}).status_code == 404
+    assert client.delete(f"/notes/{note_id}").status_code == 404
+
+
+def test_changes_invalid_token(client):
+    """A malformed token returns 400."""
+    signup(client)
+    resp = client.get("/notes/changes?since=not-a-token")
+    assert resp.status_code == 400
+    assert "error" in resp.json
+
+
+def test_changes_expired_token(app, client):
+    """A token issued before a now-purged tombstone returns 410; later tokens still work."""
+    signup(client)
+    note_id = client.post("/notes", json={"title": "Old"}).json["id"]
+    stale = client.get("/notes/changes").json["meta"]["next"]
+    client.delete(f"/notes/{note_id}")
+    fresh = client.get(f"/notes/changes?since={stale}").json["meta"]["next"]
+
+    old = db.session.scalar(db.select(db.func.now())) - timedelta(days=365)
+    db.session.execute(db.update(Note).where(Note.id == note_id).values(deleted_at=old))
+    db.session.commit()
+    assert purge_deleted_notes() == 1
+    g.pop("_login_user", None)  # the fixture's app context outlives requests; drop the cached login
+
+    assert client.get(f"/notes/changes?since={stale}").status_code == 410
+    assert client.get(f"/notes/changes?since={fresh}").status_code == 200
+
+
+def test_purge_deleted_notes(app, client):
+    """Only tombstones past the retention window are purged, in batches."""
+    signup(client)
+    ids = [client.post("/notes", json={"title": f"N{i}"}).json["id"] for i in range(3)]
+    keep = client.post("/notes", json={"title": "Keep"}).json["id"]
+    for note_id in ids:
+        client.delete(f"/notes/{note_id}")
+
+    old = db.session.scalar(db.select(db.func.now())) - timedelta(days=60)
+    db.session.execute(db.update(Note).where(Note.id.in_(ids)).values(deleted_at=old))
+    db.session.commit()
+
+    purged_seqs = db.session.scalars(db.select(Note.change_seq).where(Note.id.in_(ids))).all()
+    assert purge_deleted_notes(batch_size=2) == 3
+    assert db.session.scalars(db.select(Note.id)).all() == [keep]
+    assert change_counter()[1] == max(purged_seqs)
@@ -0,0 +1,101 @@
+# tests/test_profiling.py
+# Tests the opt-in request profiler.
+# - Disabled by default (no hooks registered)
+# - 1-in-N sampling and the signed X-Profile header
+# - cProfile and stack-sampler dumps, rotation, and the report command
+
+import os
+import time
+from app import create_app
+from app.extensions import profiler
+
+
+def make_app(tmp_path, **config):
+    return create_app({
+        "TESTING": True,
+        "PROFILER_ENABLED": True,
+        "PROFILER_DIR": str(tmp_path / "profiles"),
+        "JOBS_DATABASE": str(tmp_path / "jobs.db"),
+        "JOBS_WORKERS": 0,
+        **config,
+    })
+
+
+def dumps(tmp_path, endpoint="health"):
+    path = tmp_path / "profiles" / endpoint
+    return sorted(os.listdir(path)) if path.exists() else []
+
+
+def test_profiler_disabled_by_default(app):
+    """Without PROFILER_ENABLED no request hooks are installed."""
+    assert "profiler" not in app.extensions
+    hooks = app.before_request_funcs.get(None, [])
+    assert all(getattr(hook, "__self__", None) is not profiler for hook in hooks)
+
+
+def test_samples_one_in_n(tmp_path):
+    """PROFILER_SAMPLE_RATE=N profiles every Nth request."""
+    client = make_app(tmp_path, PROFILER_SAMPLE_RATE=3).test_client()
+    for _ in range(7):
+        client.get("/")
+    files = dumps(tmp_path)
+    assert len(files) == 2
+    assert all(f.endswith(".pstats") for f in files)
+
+
+def test_signed_header_forces_profile(tmp_path):
+    """A valid X-Profile token profiles the request; a forged one does not."""
+    app = make_app(tmp_path, PROFILER_SAMPLE_RATE=0)
+    client = app.test_client()
+    with app.app_context():
+        token = profiler.make_token()
+
+    client.get("/", headers={"X-Profile": "forged"})
+    assert dumps(tmp_path) == []
+    client.get("/", headers={"X-Profile": token})
+    assert len(dumps(tmp_path)) == 1
+
+
+def test_rotation_keeps_newest(tmp_path):
+    """Only PROFILER_MAX_FILES dumps are kept per endpoint."""
+    client = make_app(tmp_path, PROFILER_SAMPLE_RATE=1, PROFILER_MAX_FILES=3).test_client()
+    for _ in range(5):
+        client.get("/")
+    assert len(dumps(tmp_path)) == 3
+
+
+def test_sampler_mode_and_report(tmp_path):
+    """Sampler mode writes collapsed stacks; the report merges them per endpoint."""
+    app = make_app(tmp_path, PROFILER_SAMPLE_RATE=1, PROFILER_MODE="sampler")
+
+    @app.get("/busy")
+    def busy():
+        time.sleep(0.05)
+        return {}
+
+    client = app.test_client()
+    client.get("/busy")
+    client.get("/busy")
+    files = dumps(tmp_path, "busy")
+    assert len(files) == 2 and all(f.endswith(".collapsed") for f in files)
+
+    out = tmp_path / "report"
+    result = app.test_cli_runner().invoke(args=["profile", "report", "--out", str(out)])
+    assert result.exit_code == 0, result.output
+    assert "busy: 2 requests" in result.output
+    merged = (out / "busy.collapsed").read_text().splitlines()
+    assert merged and all(line.rsplit(" ", 1)[1].isdigit() for line in merged)
+    assert any("test_profiling:busy" in line for line in merged)
+
+
+def test_report_merges_pstats(tmp_path):
+    """cProfile dumps are merged into one .pstats per endpoint."""
+    app = make_app(tmp_path, PROFILER_SAMPLE_RATE=1)
+    client = app.test_client()
+    client.get("/")
+    client.get("/")
+    out = tmp_path / "report"
+    result = app.test_cli_runner().invoke(args=["profile", "report", "--out", str(out)])
+    assert result.exit_code == 0, result.output
+    assert (out / "health.pstats").exists()
+    assert "health: 2 requests" in result.output
@@ -0,0 +1,89 @@
+# tests/test_response_cache.py
+# Tests the per-user response cache.
+# - LRU eviction by entry count and byte cap
+# - Bounded per-user generations that never go backwards
+# - Cache hits on repeated list requests, invalidation on writes
+# - Isolation between users
+
+from app.cache import InProcessBackend
+from app.extensions import response_cache
+
+
+def signup(client, username):
+    """Helper: sign up (and implicitly log in) a test user."""
+    client.post("/signup", json={
+        "username": username,
+        "password": "pw",
+        "password_confirmation": "pw"
+    })
+    return client
+
+
+def test_backend_lru_eviction():
+    """Least-recently-used entries are evicted past max_entries or max_bytes."""
+    backend = InProcessBackend(max_entries=2, max_bytes=10)
+    backend.set("a", (200, b"1234"))
+    backend.set("b", (200, b"1234"))
+    backend.get("a")                   # "b" is now least recently used
+    backend.set("c", (200, b"1234"))
+    assert backend.get("b") is None
+    assert backend.get("a") is not None
+
+    backend.set("d", (200, b"123456789"))  # byte cap forces out the rest
+    assert backend.stats()["bytes"] <= 10
+    assert backend.stats()["evictions"] >= 2
+
+
+def test_backend_generations_are_bounded():
+    """Only max_generations users are tracked; evicted users never get an old generation back."""
+    backend = InProcessBackend(max_generations=2)
+    backend.bump("a")
+    stale = backend.generation("a")
+    backend.bump("b")
+    backend.bump("c")                  # "a" is evicted
+
+    assert backend.stats()["generations"] == 2
+    assert backend.generation("a") > stale
+    before = backend.generation("b")
+    backend.bump("b")
+    assert backend.generation("b") > before
+
+
+def test_list_notes_cached_until_write(app, client):
+    """Repeated list requests hit the cache; creating a note invalidates it."""
+    signup(client, "cacheuser")
+    client.post("/notes", json={"title": "One"})
+
+    assert client.get("/notes?page=1&per_page=5").headers["X-Cache"] == "MISS"
+    resp = client.get("/notes?per_page=5&page=1")  # same args, different order
+    assert resp.headers["X-Cache"] == "HIT"
+    assert len(resp.json["data"]) == 1
+
+    client.post("/notes", json={"title": "Two"})
+    resp = client.get("/notes?page=1&per_page=5")
+    assert resp.headers["X-Cache"] == "MISS"
+    assert len(resp.json["data"]) == 2
+
+    stats = response_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+
+def test_cache_is_per_user(app, client):
+    """One user's cached list is never served to another user."""
+    signup(client, "first")
+    client.post("/notes", json={"title": "Mine"})
+    client.get("/notes")
+
+    client.delete("/logout")
+    signup(client, "second")
+    resp = client.get("/notes")
+    assert resp.headers["X-Cache"] == "MISS"
+    assert resp.json["data"] == []
+
+
+def test_cache_disabled(app, client):
+    """RESPONSE_CACHE_ENABLED=False bypasses the cache entirely."""
+    app.config["RESPONSE_CACHE_ENABLED"] = False
+    signup(client, "nocache")
+    assert "X-Cache" not in client.get("/notes").headers
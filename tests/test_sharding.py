@@ -0,0 +1,209 @@
+# tests/test_sharding.py
+# Tests user-sharded note storage.
+# - Stable user -> shard mapping
+# - Notes routes read and write only the owner's shard, with globally unique IDs
+# - Unrouted notes queries fail loudly
+# - Scatter-gather, cross-shard jobs, and resharding
+# - Creating and dropping the per-shard tables
+
+import pytest
+from app import create_app
+from app.extensions import db, shards
+from app.models import Note, User
+from app.sharding import shard_for
+from app.sync import purge_deleted_notes
+
+
+def make_app(tmp_path, count):
+    return create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path}/main.db",
+        "NOTES_SHARDS": count,
+        "NOTES_SHARD_URL": f"sqlite:///{tmp_path}/notes_{{shard}}.db",
+        "NOTES_ID_BLOCK_SIZE": 3,
+        "JOBS_DATABASE": str(tmp_path / "jobs.db"),
+        "JOBS_WORKERS": 0,
+    })
+
+
+@pytest.fixture
+def sharded_app(tmp_path):
+    app = make_app(tmp_path, 3)
+    with app.app_context():
+        # db keeps a MetaData per bind key seen by any app; shard tables come from create_tables()
+        db.create_all(bind_key=None)
+        shards.create_tables()
+        yield app
+        db.session.remove()
+
+
+def add_user(email):
+    user = User(email=email)
+    user.set_password("pw")
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def rows_per_shard(count):
+    """{shard index: sorted [(user_id, note_id)]} read straight from each shard engine."""
+    result = {}
+    for index in range(count):
+        with shards.engine(index).connect() as conn:
+            result[index] = sorted(conn.execute(db.select(Note.user_id, Note.id)).all())
+    return result
+
+
+def test_shard_for_is_stable():
+    """The user -> shard mapping does not depend on the process hash seed."""
+    assert [shard_for(user_id, 4) for user_id in range(1, 9)] == \
+           [shard_for(user_id, 4) for user_id in range(1, 9)]
+    assert shard_for(12345, 1) == 0
+    assert {shard_for(user_id, 4) for user_id in range(100)} == {0, 1, 2, 3}
+
+
+def test_notes_routes_use_owner_shard(sharded_app):
+    """Each user's notes land on their own shard; IDs are unique across shards."""
+    client = sharded_app.test_client()
+    owners = {}
+    for name in ("ann", "bob", "cat", "dan"):
+        client.delete("/logout")
+        client.post("/signup", json={"username": name, "password": "pw", "password_confirmation": "pw"})
+        for i in range(4):
+            resp = client.post("/notes", json={"title": f"{name} {i}"})
+            assert resp.status_code == 201
+            owners[resp.json["id"]] = resp.json
+        assert client.get("/notes").json["meta"]["total"] == 4
+
+    per_shard = rows_per_shard(3)
+    all_ids = [note_id for rows in per_shard.values() for _, note_id in rows]
+    assert len(all_ids) == len(set(all_ids)) == 16
+    for index, rows in per_shard.items():
+        assert all(shard_for(user_id, 3) == index for user_id, _ in rows)
+
+    # Full CRUD for the last user stays on their shard
+    note_id = client.post("/notes", json={"title": "dan extra"}).json["id"]
+    assert client.put(f"/notes/{note_id}", json={"body": "edited"}).json["body"] == "edited"
+    assert client.get(f"/notes/{note_id}").status_code == 200
+    assert client.delete(f"/notes/{note_id}").status_code == 204
+    assert client.get("/notes/changes").json["deleted"] == [note_id]
+
+
+def test_other_users_note_is_403_on_any_shard(sharded_app):
+    """Another user's note answers 403 whether or not it shares the caller's shard."""
+    client = sharded_app.test_client()
+    note_ids = {}
+    for i in range(8):
+        client.delete("/logout")
+        client.post("/signup", json={"username": f"u{i}", "password": "pw", "password_confirmation": "pw"})
+        note_ids[client.get("/check_session").json["id"]] = client.post("/notes", json={"title": "x"}).json["id"]
+
+    me = client.get("/check_session").json["id"]
+    others = {shard_for(user_id, 3) == shard_for(me, 3) for user_id in note_ids if user_id != me}
+    assert others == {True, False}  # both same-shard and cross-shard neighbours
+    for user_id, note_id in note_ids.items():
+        if user_id != me:
+            assert client.get(f"/notes/{note_id}").status_code == 403
+            assert client.put(f"/notes/{note_id}", json={"title": "y"}).status_code == 403
+    assert client.get(f"/notes/{max(note_ids.values()) + 1000}").status_code == 404
+
+
+def test_unrouted_notes_query_raises(sharded_app):
+    """Querying notes without a shard context is an error, not a silent default."""
+    with pytest.raises(RuntimeError):
+        Note.query.count()
+
+
+def test_scatter_gather_and_cross_shard_jobs(sharded_app):
+    """scatter_gather reads every shard; the purge job walks every shard."""
+    users = [add_user(f"user{i}@example.com") for i in range(6)]
+    for user in users:
+        with shards.using(user.id):
+            db.session.add(Note(user_id=user.id, title="n", deleted_at=db.func.datetime("now", "-60 days")))
+            db.session.commit()
+
+    assert len(shards.scatter_gather(db.select(Note.id))) == 6
+    assert purge_deleted_notes(batch_size=2) == 6
+    assert shards.scatter_gather(db.select(Note.id)) == []
+
+
+def test_reshard_moves_notes_to_new_layout(tmp_path):
+    """Resharding 3 -> 5 moves every note to its new shard and keeps IDs and change order."""
+    app = make_app(tmp_path, 3)
+    with app.app_context():
+        db.create_all(bind_key=None)
+        shards.create_tables()
+        user_ids = [add_user(f"user{i}@example.com").id for i in range(10)]
+        for user_id in user_ids:
+            with shards.using(user_id):
+                db.session.add_all([Note(user_id=user_id, title=f"t{i}", body="b" * 2000) for i in range(3)])
+                db.session.commit()
+        before = sorted(shards.scatter_gather(db.select(Note.id, Note.user_id, Note.body)))
+        last_seq = max(seq for (seq,) in shards.scatter_gather(db.select(Note.change_seq)))
+        db.session.remove()
+
+    app = make_app(tmp_path, 5)
+    with app.app_context():
+        moved = shards.reshard(from_count=3, batch_size=4)
+        assert moved > 0
+        assert shards.reshard(from_count=3, batch_size=4) == 0  # idempotent
+
+        after = sorted(shards.scatter_gather(db.select(Note.id, Note.user_id, Note.body)))
+        assert after == before
+        for index, rows in rows_per_shard(5).items():
+            assert all(shard_for(user_id, 5) == index for user_id, _ in rows)
+
+        # New IDs never collide with moved ones
+        with shards.using(user_ids[0]):
+            note = Note(user_id=user_ids[0], title="new")
+            db.session.add(note)
+            db.session.commit()
+            assert note.id > max(note_id for note_id, _, _ in before)
+            # ...and new changes sort after every moved one, so old sync tokens stay valid
+            assert note.change_seq > last_seq
+        db.session.remove()
+
+
+def test_user_and_note_in_one_transaction(sharded_app):
+    """Allocating a note ID does not wait on the session's own uncommitted main-database write."""
+    user = User(email="seed@example.com")
+    user.set_password("pw")
+    db.session.add(user)
+    db.session.flush()
+
+    with shards.using(user.id):
+        db.session.add_all([Note(user_id=user.id, title=f"n{i}") for i in range(5)])
+        db.session.commit()
+        assert Note.query.filter_by(user_id=user.id).count() == 5
+
+
+def test_rolled_back_id_reservation_is_discarded(sharded_app):
+    """IDs reserved by a transaction that rolls back are never handed out from the shared pool."""
+    user_id = add_user("rollback@example.com").id
+    with shards.using(user_id):
+        db.session.add(Note(user_id=user_id, title="gone"))
+        db.session.flush()
+        reserved = db.session.scalar(db.select(Note.id))
+        db.session.rollback()
+
+        note = Note(user_id=user_id, title="kept")
+        db.session.add(note)
+        db.session.commit()
+        # The allocator row rolled back too, so the same block is reserved again from the start
+        assert note.id == reserved
+
+
+def test_drop_tables_clears_every_shard(sharded_app):
+    """drop_tables() removes the notes tables that create_tables() put on each shard."""
+    user = add_user("dropper@example.com")
+    with shards.using(user.id):
+        db.session.add(Note(user_id=user.id, title="Gone"))
+        db.session.commit()
+
+    shards.drop_tables()
+    for index in range(3):
+        tables = db.inspect(shards.engine(index)).get_table_names()
+        assert "notes" not in tables and "note_change_counter" not in tables
+
+    shards.create_tables()
+    assert rows_per_shard(3) == {0: [], 1: [], 2: []}